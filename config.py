@@ -8,24 +8,44 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-def _require(key: str) -> str:
-    """Get required environment variable or raise."""
+def _require(key: str, required: bool = True) -> str | None:
+    """Get required environment variable or raise (when `required`)."""
     value = os.getenv(key)
-    if not value:
+    if not value and required:
         raise ValueError(f"Missing required environment variable: {key}")
     return value
 
 
+def _flag(key: str, default: bool) -> bool:
+    """Get boolean environment variable (true/1/yes)."""
+    value = os.getenv(key)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes")
+
+
 # LLM API Keys
 GEMINI_API_KEY = _require("GEMINI_API_KEY")
 OPENAI_API_KEY = _require("OPENAI_API_KEY")
 
-# Google Cloud Storage
-GCS_BUCKET_NAME = _require("GCS_BUCKET_NAME")
-_gcs_creds_raw = _require("GCS_CREDENTIALS_JSON")
+# Object storage for PDFs, images and packed chunks: "gcs" (default) or
+# "local" (files under OBJECT_STORE_PATH; signed URLs point at this API's
+# /api/objects route, so OBJECT_STORE_PUBLIC_URL must be the API's address)
+OBJECT_STORE_BACKEND = os.getenv("OBJECT_STORE_BACKEND", "gcs")
+OBJECT_STORE_PATH = os.getenv(
+    "OBJECT_STORE_PATH", str(Path(__file__).parent / "data" / "objects")
+)
+OBJECT_STORE_PUBLIC_URL = os.getenv("OBJECT_STORE_PUBLIC_URL", "http://localhost:8000")
+
+# Google Cloud Storage (required for the gcs object store)
+_uses_gcs = OBJECT_STORE_BACKEND == "gcs"
+GCS_BUCKET_NAME = _require("GCS_BUCKET_NAME", _uses_gcs)
+_gcs_creds_raw = _require("GCS_CREDENTIALS_JSON", _uses_gcs)
 
 # Handle GCS credentials: can be a file path OR a JSON string (for cloud deployment)
-if _gcs_creds_raw.strip().startswith("{"):
+if not _gcs_creds_raw:
+    GCS_CREDENTIALS_JSON = None
+elif _gcs_creds_raw.strip().startswith("{"):
     # It's a JSON string - write to temp file for google-cloud-storage
     _creds_dict = json.loads(_gcs_creds_raw)
     _temp_creds = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False)
@@ -39,11 +59,113 @@ else:
     if not _gcs_path.is_absolute():
         GCS_CREDENTIALS_JSON = str(Path(__file__).parent / GCS_CREDENTIALS_JSON)
 
-# Airtable
-AIRTABLE_API_KEY = _require("AIRTABLE_API_KEY")
-AIRTABLE_BASE_ID = _require("AIRTABLE_BASE_ID")
-AIRTABLE_DOCUMENTS_TABLE_ID = _require("AIRTABLE_DOCUMENTS_TABLE_ID")
-AIRTABLE_CHUNKS_TABLE_ID = _require("AIRTABLE_CHUNKS_TABLE_ID")
+# Chunk/document store: "airtable" (default), "replica" (Airtable with a local
+# SQLite read replica) or "sqlite" (embedded, no rate limits)
+STORE_BACKEND = os.getenv("STORE_BACKEND", "airtable")
+SQLITE_STORE_PATH = os.getenv(
+    "SQLITE_STORE_PATH", str(Path(__file__).parent / "data" / "docuquery.db")
+)
+REPLICA_PATH = os.getenv(
+    "REPLICA_PATH", str(Path(__file__).parent / "data" / "airtable-replica.db")
+)
+REPLICA_SYNC_INTERVAL = float(os.getenv("REPLICA_SYNC_INTERVAL", "30"))
+REPLICA_FULL_SYNC_INTERVAL = float(os.getenv("REPLICA_FULL_SYNC_INTERVAL", "900"))
+
+# Airtable (required unless the store is SQLite-only)
+_uses_airtable = STORE_BACKEND in ("airtable", "replica")
+AIRTABLE_API_KEY = _require("AIRTABLE_API_KEY", _uses_airtable)
+AIRTABLE_BASE_ID = _require("AIRTABLE_BASE_ID", _uses_airtable)
+AIRTABLE_DOCUMENTS_TABLE_ID = _require("AIRTABLE_DOCUMENTS_TABLE_ID", _uses_airtable)
+AIRTABLE_CHUNKS_TABLE_ID = _require("AIRTABLE_CHUNKS_TABLE_ID", _uses_airtable)
+
+# Airtable HTTP connection pool (shared by the query path and the pipeline)
+AIRTABLE_HTTP2 = _flag("AIRTABLE_HTTP2", True)
+AIRTABLE_MAX_CONNECTIONS = int(os.getenv("AIRTABLE_MAX_CONNECTIONS", "20"))
+AIRTABLE_MAX_KEEPALIVE = int(os.getenv("AIRTABLE_MAX_KEEPALIVE", "10"))
+AIRTABLE_KEEPALIVE_EXPIRY = float(os.getenv("AIRTABLE_KEEPALIVE_EXPIRY", "60"))
+
+# Airtable rate limiting: token bucket, shared across worker processes when
+# AIRTABLE_RATE_LIMIT_STATE points at a SQLite file
+AIRTABLE_RATE_LIMIT = float(os.getenv("AIRTABLE_RATE_LIMIT", "5"))
+AIRTABLE_RATE_LIMIT_BURST = float(os.getenv("AIRTABLE_RATE_LIMIT_BURST", "1"))
+AIRTABLE_RATE_LIMIT_STATE = os.getenv("AIRTABLE_RATE_LIMIT_STATE") or None
+AIRTABLE_MAX_RETRIES = int(os.getenv("AIRTABLE_MAX_RETRIES", "5"))
+
+# Packed chunk bodies: store each document's chunk text in one compressed
+# GCS blob (chunks/{doc_id}/chunks.bin) instead of content_raw fields
+CHUNK_BLOB_STORAGE = _flag("CHUNK_BLOB_STORAGE", False)
+CHUNK_BLOB_CACHE_DIR = os.getenv(
+    "CHUNK_BLOB_CACHE_DIR", str(Path(tempfile.gettempdir()) / "docuquery-chunk-blobs")
+)
+CHUNK_BLOB_CACHE_MAX_BYTES = int(os.getenv("CHUNK_BLOB_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Gemini extraction batches in flight: starts at EXTRACTION_CONCURRENCY,
+# grows by one per round of successes up to EXTRACTION_MAX_CONCURRENCY and
+# halves on rate limiting
+EXTRACTION_CONCURRENCY = int(os.getenv("EXTRACTION_CONCURRENCY", "4"))
+EXTRACTION_MAX_CONCURRENCY = int(os.getenv("EXTRACTION_MAX_CONCURRENCY", "8"))
+
+# Break scoring: "offsets" (GPT-4o returns paragraph numbers and scores,
+# markers inserted locally), "text" (GPT-4o returns the text with markers)
+# or "local" (no GPT-4o; scored from headings, blocks, lists, page
+# transitions and lexical cohesion). Uploads can override it per document.
+# "text" stays the default until offsets mode has been compared against it.
+BREAK_SCORING_MODE = os.getenv("BREAK_SCORING_MODE", "text")
+
+# GPT-4o break-scoring segments in flight (same adaptive scheme)
+BREAK_SCORING_CONCURRENCY = int(os.getenv("BREAK_SCORING_CONCURRENCY", "2"))
+BREAK_SCORING_MAX_CONCURRENCY = int(os.getenv("BREAK_SCORING_MAX_CONCURRENCY", "4"))
+
+# Gemini extraction batch size: consecutive pages are batched until their
+# estimated output (from text-layer length, images and rulings) reaches
+# EXTRACTION_BATCH_TOKENS, well under the 32k max_output_tokens, or the
+# batch has EXTRACTION_MAX_BATCH_PAGES pages
+EXTRACTION_BATCH_TOKENS = int(os.getenv("EXTRACTION_BATCH_TOKENS", "12000"))
+EXTRACTION_MAX_BATCH_PAGES = int(os.getenv("EXTRACTION_MAX_BATCH_PAGES", "15"))
+
+# "document": upload the whole PDF to Gemini once and address page ranges
+# per batch; "batch": upload a sub-PDF per batch. Documents longer than
+# EXTRACTION_DOCUMENT_MAX_PAGES always use batch uploads (every request
+# pays input tokens for the whole attached file)
+EXTRACTION_UPLOAD_MODE = os.getenv("EXTRACTION_UPLOAD_MODE", "document")
+EXTRACTION_DOCUMENT_MAX_PAGES = int(os.getenv("EXTRACTION_DOCUMENT_MAX_PAGES", "100"))
+
+# Extract pages with a clean text layer and simple layout locally; only
+# scanned, table, figure and multi-column pages go to Gemini
+TEXT_LAYER_FAST_PATH = _flag("TEXT_LAYER_FAST_PATH", True)
+
+# Cache of Gemini page extractions keyed by page content, prompt and model:
+# a local LRU directory, plus object storage (extraction-cache/) when
+# EXTRACTION_CACHE_SHARED is set
+EXTRACTION_CACHE = _flag("EXTRACTION_CACHE", True)
+EXTRACTION_CACHE_DIR = os.getenv(
+    "EXTRACTION_CACHE_DIR", str(Path(tempfile.gettempdir()) / "docuquery-extraction-cache")
+)
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+EXTRACTION_CACHE_SHARED = _flag("EXTRACTION_CACHE_SHARED", False)
+
+# Local spool of uploaded PDFs, read by the pipeline instead of
+# downloading them back from GCS (LRU-evicted above the size limit)
+PDF_SPOOL_DIR = os.getenv("PDF_SPOOL_DIR", str(Path(tempfile.gettempdir()) / "docuquery-pdf-spool"))
+PDF_SPOOL_MAX_BYTES = int(os.getenv("PDF_SPOOL_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# Seconds a cached document list may be served (via ETag/304) without
+# re-reading the store, to pick up changes made by other worker processes
+DOCUMENT_LIST_MAX_AGE = float(os.getenv("DOCUMENT_LIST_MAX_AGE", "15"))
+
+# Resumable PDF uploads are sent in pieces of this size (a multiple of 256KB)
+GCS_UPLOAD_CHUNK_SIZE = int(os.getenv("GCS_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+# Parallel batch requests when deleting a document's GCS objects
+GCS_DELETE_CONCURRENCY = int(os.getenv("GCS_DELETE_CONCURRENCY", "4"))
+
+# Signed PDF/page-image URLs (valid 1 hour) are cached in memory until this
+# many seconds before they expire
+SIGNED_URL_CACHE_MARGIN = float(os.getenv("SIGNED_URL_CACHE_MARGIN", "900"))
+
+# Log a per-document / per-query summary of outbound I/O (call counts,
+# latency, bytes, retries, rate-limit waits); totals are always at /metrics
+METRICS_LOG_SUMMARY = _flag("METRICS_LOG_SUMMARY", False)
 
 # CORS
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
@@ -1,5 +1,5 @@
 
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useMemo } from 'react';
 import { Document, ChatMessage } from './types';
 import { api } from './services/api';
 import DocumentManager from './components/DocumentManager';
@@ -27,16 +27,25 @@ const App: React.FC = () => {
     fetchDocuments().finally(() => setLoadingDocs(false));
   }, [fetchDocuments]);
 
+  // Status changes are pushed over SSE; one connection for the app's lifetime
+  useEffect(() => api.subscribeToDocumentEvents(fetchDocuments), [fetchDocuments]);
+
+  const needsPolling = useMemo(
+    () => documents.some(doc => doc.status === 'uploading' || doc.status === 'processing'),
+    [documents]
+  );
+
   useEffect(() => {
-    const needsPolling = documents.some(doc => doc.status === 'uploading' || doc.status === 'processing');
     if (!needsPolling) return;
 
+    // Slow poll as a fallback for changes made by other server processes
+    // (unchanged polls return 304)
     const interval = setInterval(() => {
       fetchDocuments();
-    }, 3000);
+    }, 15000);
 
     return () => clearInterval(interval);
-  }, [documents, fetchDocuments]);
+  }, [needsPolling, fetchDocuments]);
 
   const handleUpload = async (file: File) => {
     try {
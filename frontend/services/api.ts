@@ -11,9 +11,25 @@ export const api = {
     return res.json();
   },
 
-  async uploadDocument(file: File): Promise<UploadResponse> {
+  subscribeToDocumentEvents(onChange: () => void): () => void {
+    const source = new EventSource(`${API_BASE}/api/documents/events`);
+    source.addEventListener('status', () => onChange());
+    // The server sends its version on every (re)connect; after a reconnect,
+    // refetch in case status events were missed while disconnected
+    let connected = false;
+    source.addEventListener('version', () => {
+      if (connected) onChange();
+      connected = true;
+    });
+    return () => source.close();
+  },
+
+  async uploadDocument(file: File, breakScoring?: string): Promise<UploadResponse> {
     const formData = new FormData();
     formData.append('file', file);
+    if (breakScoring) {
+      formData.append('break_scoring', breakScoring);
+    }
 
     const res = await fetch(`${API_BASE}/api/documents/upload`, {
       method: 'POST',
@@ -1,12 +1,64 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 import config
-from routers import documents, query
+from routers import documents, objects, query
+from services import metrics, purge
+from services.store import store
+
+logger = logging.getLogger(__name__)
+
+# Uvicorn only configures its own loggers; without a handler here the app's
+# INFO logs (startup maintenance, METRICS_LOG_SUMMARY summaries) are dropped
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(levelname)s:     %(name)s: %(message)s"))
+for _name in (__name__, "routers", "services", "pipeline"):
+    logging.getLogger(_name).addHandler(_log_handler)
+    logging.getLogger(_name).setLevel(logging.INFO)
+
+
+def _startup_maintenance() -> None:
+    """Migrate chunks missing doc_record_id, then finish pending purges."""
+    if config.STORE_BACKEND in ("airtable", "replica"):
+        from services import airtable
+
+        # Rename and purge find chunks by doc_record_id; chunks written before
+        # the field existed would be missed (and orphaned by purges)
+        try:
+            count = airtable.backfill_chunk_doc_ids()
+            if count:
+                logger.info(f"Backfilled doc_record_id on {count} chunks")
+        except Exception:
+            logger.exception(
+                "doc_record_id backfill failed; the Chunks table needs a "
+                "doc_record_id text field (see docs/airtable-schema.md)"
+            )
 
-app = FastAPI(title="DocuQuery RAG API")
+    # Finish purging documents deleted before the last shutdown
+    purge.sweep()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    maintenance = asyncio.create_task(asyncio.to_thread(_startup_maintenance))
+    yield
+    maintenance.cancel()
+    # Close pooled store connections on shutdown
+    await store.aclose()
+    store.close()
+
+
+app = FastAPI(title="DocuQuery RAG API", lifespan=lifespan)
 app.include_router(documents.router)
 app.include_router(query.router)
+if config.OBJECT_STORE_BACKEND == "local":
+    # Serves the local object store's signed URLs
+    app.include_router(objects.router)
 
 # Parse FRONTEND_URL - supports comma-separated values for multiple origins
 _origins = [o.strip() for o in config.FRONTEND_URL.split(",")]
@@ -23,3 +75,9 @@ app.add_middleware(
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Outbound I/O totals in Prometheus text format."""
+    return metrics.render_prometheus()
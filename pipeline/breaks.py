@@ -3,39 +3,100 @@ Step 3: Break scoring using GPT-4o.
 
 Inserts semantic break markers into extracted text.
 Returns text with [BREAK id=X score=Y] markers.
+
+Long documents are split into overlapping segments that are scored
+concurrently under an adaptive concurrency limit shared by all documents.
+The model's markers are aligned back to the original text (on its
+non-whitespace characters, with short text anchors where the model altered
+the text) and inserted into the original, so overlapping regions appear
+once. In an overlap, a break is kept only from the segment whose window
+centre is nearer, i.e. the segment that saw the region in its middle.
+
+In "offsets" mode (BREAK_SCORING_MODE) the model instead receives numbered
+paragraphs and returns only (paragraph, score) pairs as JSON, and the
+markers are inserted locally: output is ~1% of the input, segments can be
+five times larger, and the text can't be altered.
+
+In "local" mode no model is called: boundaries are scored from document
+structure and lexical cohesion (see local_breaks), for bulk backfills and
+low-value documents.
 """
 
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from openai import OpenAI
 
 import config
+from pipeline import local_breaks
+from services import metrics
+from services.ratelimit import AdaptiveConcurrency
+
+logger = logging.getLogger(__name__)
+
+# Valid break scoring modes (BREAK_SCORING_MODE, or per upload)
+MODES = ("offsets", "text", "local")
 
 # Initialize OpenAI client
 _client = OpenAI(api_key=config.OPENAI_API_KEY)
 
+# Segments in flight, shared by every document being processed
+_limiter = AdaptiveConcurrency(
+    initial=config.BREAK_SCORING_CONCURRENCY,
+    maximum=config.BREAK_SCORING_MAX_CONCURRENCY,
+)
+
 # Load break scoring prompt
 _PROMPT_PATH = Path(__file__).parent.parent / "docs" / "prompts" / "break-scoring.md"
-_PROMPT_TEMPLATE = None
+_OFFSETS_PROMPT_PATH = _PROMPT_PATH.with_name("break-scoring-offsets.md")
+_PROMPT_TEMPLATES: dict[Path, str] = {}
 
 # Token limits - GPT-4o output is capped at 16384 tokens
 # Since break scoring outputs ~input + markers, segment size must fit in output limit
 _MAX_TOKENS_PER_SEGMENT = 12000  # Leaves room for break markers in output
 _OVERLAP_TOKENS = 2000
 
-
-def _load_prompt() -> str:
-    """Load and cache the break scoring prompt."""
-    global _PROMPT_TEMPLATE
-    if _PROMPT_TEMPLATE is None:
-        content = _PROMPT_PATH.read_text()
+# Offsets mode returns only (paragraph, score) pairs (~10 tokens per
+# paragraph), so segments are bounded by the input context instead
+_OFFSETS_MAX_TOKENS_PER_SEGMENT = 60000
+_OFFSETS_OVERLAP_TOKENS = 3000
+_OFFSETS_MAX_OUTPUT_TOKENS = 8000
+
+# Blank lines separating paragraphs
+_PARAGRAPH_GAP = re.compile(r"\n[ \t]*\n\s*")
+# Block delimiters; a block is kept in one paragraph however many blank
+# lines it contains
+_BLOCK_DELIMITERS = (
+    ("%%% GRAPHIC_INSERT %%%", "%%% END_GRAPHIC_INSERT %%%"),
+    ("%%% TABLE_START", "%%% TABLE_END %%%"),
+)
+# An unterminated block is cut off after this many characters
+_MAX_BLOCK_CHARS = 20000
+
+_BREAK_MARKER = re.compile(r"\[BREAK id=\d+ score=(\d+)\]")
+# Non-whitespace characters of context used to re-locate a marker when the
+# model's copy of the text differs from the original
+_ANCHOR_CHARS = 32
+# How far (in non-whitespace characters) from its expected position an
+# anchor is searched for
+_ANCHOR_WINDOW = 4000
+
+
+def _load_prompt(path: Path = _PROMPT_PATH) -> str:
+    """Load and cache a break scoring prompt."""
+    if path not in _PROMPT_TEMPLATES:
+        content = path.read_text()
         # Extract just the prompt between the code fence
         parts = content.split("```")
         if len(parts) >= 2:
-            _PROMPT_TEMPLATE = parts[1].strip()
+            _PROMPT_TEMPLATES[path] = parts[1].strip()
         else:
-            _PROMPT_TEMPLATE = content
-    return _PROMPT_TEMPLATE
+            _PROMPT_TEMPLATES[path] = content
+    return _PROMPT_TEMPLATES[path]
 
 
 def _estimate_tokens(text: str) -> int:
@@ -46,7 +107,8 @@ def _estimate_tokens(text: str) -> int:
 def _split_for_processing(text: str) -> list[tuple[str, int, int]]:
     """
     Split text into segments for processing.
-    Returns list of (segment_text, start_char, end_char) tuples.
+    Returns list of (segment_text, start_char, end_char) tuples, where
+    segment_text == text[start_char:end_char].
     """
     tokens = _estimate_tokens(text)
     if tokens <= _MAX_TOKENS_PER_SEGMENT:
@@ -67,7 +129,7 @@ def _split_for_processing(text: str) -> list[tuple[str, int, int]]:
         if current_tokens + para_tokens > _MAX_TOKENS_PER_SEGMENT and current_segment:
             # Save current segment
             segment_text = "\n\n".join(current_segment)
-            segments.append((segment_text, current_start, char_pos))
+            segments.append((segment_text, current_start, char_pos - 2))
 
             # Start new segment with overlap
             overlap_paras = []
@@ -81,7 +143,10 @@ def _split_for_processing(text: str) -> list[tuple[str, int, int]]:
 
             current_segment = overlap_paras + [para]
             current_tokens = overlap_tokens + para_tokens
-            current_start = char_pos - len("\n\n".join(overlap_paras)) if overlap_paras else char_pos
+            # The overlap paragraphs end just before the "\n\n" preceding para
+            current_start = (
+                char_pos - 2 - len("\n\n".join(overlap_paras)) if overlap_paras else char_pos
+            )
         else:
             current_segment.append(para)
             current_tokens += para_tokens
@@ -96,88 +161,323 @@ def _split_for_processing(text: str) -> list[tuple[str, int, int]]:
     return segments
 
 
-def score_breaks(text: str) -> str:
+def score_breaks(text: str, mode: str | None = None) -> str:
     """
-    Insert break markers into extracted text using GPT-4o.
+    Insert break markers into extracted text using GPT-4o (or locally).
+
+    For large documents, splits into overlapping segments scored
+    concurrently; every break is inserted into the original text once.
+
+    Args:
+        text: Extracted text with [PAGE X] markers
+        mode: "text" (the model returns the text with markers inserted),
+            "offsets" (the model returns paragraph numbers and scores) or
+            "local" (scored from document structure, no model);
+            default BREAK_SCORING_MODE
+    """
+    mode = mode or config.BREAK_SCORING_MODE
+
+    if mode == "local":
+        return _insert_breaks(text, local_breaks.score_paragraphs(text, _paragraphs(text)))
+
+    if mode == "text":
+        segments = _split_for_processing(text)
+        prompt = _load_prompt()
 
-    For large documents (>100k tokens), splits into segments with overlap.
+        def score_segment(segment: tuple[str, int, int]) -> list[tuple[int, int]]:
+            segment_text, start, _ = segment
+            result = _process_segment(segment_text, prompt)
+            return [
+                (start + offset, score) for offset, score in _align_breaks(result, segment_text)
+            ]
+
+    elif mode == "offsets":
+        paragraphs = _paragraphs(text)
+        segments = _split_paragraphs(text, paragraphs)
+        prompt = _load_prompt(_OFFSETS_PROMPT_PATH)
+
+        def score_segment(segment: tuple[range, int, int]) -> list[tuple[int, int]]:
+            indices = segment[0]
+            return _score_paragraphs(text, [paragraphs[i] for i in indices], prompt)
+
+    else:
+        raise ValueError(f"Unsupported break scoring mode: {mode}")
+
+    return _insert_breaks(text, _score_segments(segments, score_segment))
+
+
+def _score_segments(segments: list[tuple], score_segment) -> list[tuple[int, int]]:
     """
-    segments = _split_for_processing(text)
-    prompt = _load_prompt()
+    Score segments concurrently and reconcile their overlaps.
 
+    Args:
+        segments: (payload, start_char, end_char) per segment
+        score_segment: Returns a segment's (position, score) breaks
+
+    Returns:
+        (position, score) breaks, each overlap's from its owning segment
+    """
     if len(segments) == 1:
-        # Simple case: single segment
-        return _process_segment(segments[0][0], prompt)
+        return score_segment(segments[0])
+
+    workers = min(config.BREAK_SCORING_MAX_CONCURRENCY, len(segments))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        scored = list(executor.map(metrics.propagate(score_segment), segments))
 
-    # Multi-segment processing
-    import time
-    results = []
-    for i, (segment_text, start, end) in enumerate(segments):
-        if i > 0:
-            time.sleep(2)  # Pause between segments to avoid rate limits
-        result = _process_segment(segment_text, prompt)
+    # In overlaps, keep each break only from the segment that saw it nearest
+    # the middle of its window
+    breaks = []
+    for i, segment_breaks in enumerate(scored):
+        breaks.extend(b for b in segment_breaks if _owner(b[0], segments) == i)
+    return breaks
 
-        if i > 0:
-            # Handle overlap: prefer breaks from segment with region in middle
-            # For simplicity, just trim overlapping break markers from start
-            result = _trim_overlap_start(result)
 
-        results.append(result)
+def _paragraphs(text: str) -> list[tuple[int, int]]:
+    """
+    (start, end) of each paragraph, split at blank lines.
+
+    Code fences, GRAPHIC_INSERT and TABLE blocks are kept whole, so no
+    break can land inside one.
+    """
+    paragraphs = []
+    start = None  # Start of the paragraph being built
+    in_fence = False
+    open_blocks = 0
+    position = 0
+    gaps = list(_PARAGRAPH_GAP.finditer(text))
+    for end, next_position in [(m.start(), m.end()) for m in gaps] + [(len(text), len(text))]:
+        piece = text[position:end]
+        if piece.strip():
+            if start is None:
+                start = position
+            in_fence ^= piece.count("```") % 2 == 1
+            for opener, closer in _BLOCK_DELIMITERS:
+                open_blocks += piece.count(opener) - piece.count(closer)
+            if (not in_fence and open_blocks <= 0) or end - start > _MAX_BLOCK_CHARS:
+                paragraphs.append((start, end))
+                start = None
+                in_fence = False
+                open_blocks = 0
+        position = next_position
+    if start is not None:
+        paragraphs.append((start, len(text.rstrip())))
+    return paragraphs
+
+
+def _split_paragraphs(
+    text: str, paragraphs: list[tuple[int, int]]
+) -> list[tuple[range, int, int]]:
+    """
+    Group paragraphs into overlapping segments for offsets mode.
 
-    # Combine and resequence break IDs
-    combined = "\n\n".join(results)
-    return _resequence_breaks(combined)
+    Returns:
+        (paragraph indices, start_char, end_char) per segment
+    """
+    tokens = [_estimate_tokens(text[start:end]) for start, end in paragraphs]
+    segments = []
+    first = 0
+    while first < len(paragraphs):
+        last = first
+        total = tokens[first]
+        while last + 1 < len(paragraphs) and total + tokens[last + 1] <= _OFFSETS_MAX_TOKENS_PER_SEGMENT:
+            last += 1
+            total += tokens[last]
+        segments.append((range(first, last + 1), paragraphs[first][0], paragraphs[last][1]))
+        if last + 1 >= len(paragraphs):
+            break
+
+        # Next segment starts with up to _OFFSETS_OVERLAP_TOKENS of this one
+        next_first = last + 1
+        overlap = 0
+        while next_first - 1 > first and overlap + tokens[next_first - 1] <= _OFFSETS_OVERLAP_TOKENS:
+            next_first -= 1
+            overlap += tokens[next_first]
+        first = next_first
+    return segments
 
 
-def _process_segment(text: str, prompt: str, max_retries: int = 5) -> str:
-    """Process a single segment with GPT-4o, with retry logic for rate limits."""
-    import time
+def _score_paragraphs(
+    text: str, paragraphs: list[tuple[int, int]], prompt: str
+) -> list[tuple[int, int]]:
+    """
+    Score the boundaries between numbered paragraphs with GPT-4o.
 
-    for attempt in range(max_retries):
+    Returns:
+        (position, score) breaks; a break's position is the start of the
+        paragraph it precedes
+    """
+    numbered = "\n\n".join(
+        f"[P{number}] {text[start:end]}" for number, (start, end) in enumerate(paragraphs, 1)
+    )
+    result = _process_segment(
+        numbered, prompt, max_tokens=_OFFSETS_MAX_OUTPUT_TOKENS, json_output=True
+    )
+
+    try:
+        pairs = json.loads(result)["breaks"]
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        raise ValueError(f"Break scoring returned invalid JSON: {e}") from e
+
+    breaks = []
+    for pair in pairs:
         try:
-            response = _client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": text},
-                ],
-                temperature=0.1,
-                max_tokens=16000,
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            err_msg = str(e).lower()
-            is_rate_limit = any(
-                s in err_msg
-                for s in ["rate", "resource", "exhausted", "429", "quota", "limit"]
-            )
-            if is_rate_limit and attempt < max_retries - 1:
-                wait_time = (attempt + 1) * 15  # 15s, 30s, 45s, 60s
-                time.sleep(wait_time)
-            else:
-                raise
+            number, score = int(pair[0]), int(pair[1])
+        except (TypeError, ValueError, IndexError):
+            continue
+        # Paragraph 1 has no boundary before it within this segment
+        if 2 <= number <= len(paragraphs):
+            breaks.append((paragraphs[number - 1][0], max(0, min(100, score))))
+    return breaks
 
 
-def _trim_overlap_start(text: str) -> str:
-    """Remove break markers from the beginning of overlapped text."""
-    import re
+def _owner(position: int, segments: list[tuple]) -> int:
+    """Index of the segment containing `position` nearest its centre."""
+    # A segment can't judge a boundary at its very edge (it sees only one
+    # side), so edges count only if no segment has the position inside
+    containing = [i for i, (_, start, end) in enumerate(segments) if start < position < end]
+    if not containing:
+        containing = [i for i, (_, start, end) in enumerate(segments) if start <= position <= end]
+    return min(containing, key=lambda i: abs(position - (segments[i][1] + segments[i][2]) / 2))
 
-    lines = text.split("\n")
-    # Skip lines until we find content that's clearly past the overlap
-    # (This is a simplified approach)
-    return text
 
+def _non_whitespace(text: str) -> tuple[str, list[int]]:
+    """Text without whitespace, and each remaining character's index in `text`."""
+    positions = [i for i, c in enumerate(text) if not c.isspace()]
+    return "".join(text[i] for i in positions), positions
 
-def _resequence_breaks(text: str) -> str:
-    """Renumber all break IDs sequentially from 1."""
-    import re
 
-    pattern = r"\[BREAK id=\d+ score=(\d+)\]"
-    counter = [0]  # Use list to allow mutation in closure
+def _align_breaks(result: str, segment: str) -> list[tuple[int, int]]:
+    """
+    Locate the model's break markers in the original segment.
+
+    Positions are compared on non-whitespace characters, so reflowed
+    whitespace doesn't matter. If the model changed the text itself, each
+    marker is re-located by the text just before it (or, failing that,
+    just after it) near its expected position; markers that can't be
+    placed are dropped.
+
+    Returns:
+        (offset in segment, score) per marker; the offset is the start of
+        the first non-whitespace character after the marker
+    """
+    segment_chars, segment_positions = _non_whitespace(segment)
+
+    # Strip the markers, noting how many characters precede each
+    parts = []
+    markers = []  # (non-whitespace chars before, score)
+    count = 0
+    last = 0
+    for match in _BREAK_MARKER.finditer(result):
+        part = "".join(result[last : match.start()].split())
+        parts.append(part)
+        count += len(part)
+        markers.append((count, int(match.group(1))))
+        last = match.end()
+    parts.append("".join(result[last:].split()))
+    result_chars = "".join(parts)
+
+    if result_chars == segment_chars:
+        located = markers
+    else:
+        located = []
+        cursor = 0
+        shift = 0  # Drift between the model's text and the original
+        for index, score in markers:
+            expected = index + shift
+            low = max(cursor, expected - _ANCHOR_WINDOW)
+            high = expected + _ANCHOR_WINDOW
+            position = None
+            before = result_chars[max(0, index - _ANCHOR_CHARS) : index]
+            after = result_chars[index : index + _ANCHOR_CHARS]
+            if not before:
+                position = 0
+            else:
+                found = segment_chars.find(before, low, high + len(before))
+                if found >= 0:
+                    position = found + len(before)
+            if position is None and after:
+                found = segment_chars.find(after, low, high + len(after))
+                if found >= 0:
+                    position = found
+            if position is None:
+                continue
+            located.append((position, score))
+            shift = position - index
+            cursor = position
+
+        if len(located) < len(markers):
+            logger.warning(
+                f"Break scoring: {len(markers) - len(located)} of {len(markers)} "
+                "markers could not be aligned to the original text"
+            )
 
-    def replace_fn(match):
-        counter[0] += 1
-        score = match.group(1)
-        return f"[BREAK id={counter[0]} score={score}]"
+    return [
+        (segment_positions[index] if index < len(segment_positions) else len(segment), score)
+        for index, score in located
+    ]
 
-    return re.sub(pattern, replace_fn, text)
+
+def _insert_breaks(text: str, breaks: list[tuple[int, int]]) -> str:
+    """
+    Insert markers at (position, score) pairs, numbered from 1.
+
+    Each marker is followed by a newline and placed just before the
+    content it precedes; of several breaks at one position the highest
+    score wins.
+    """
+    by_position: dict[int, int] = {}
+    for position, score in breaks:
+        by_position[position] = max(score, by_position.get(position, 0))
+
+    parts = []
+    last = 0
+    for break_id, position in enumerate(sorted(by_position), 1):
+        parts.append(text[last:position])
+        parts.append(f"[BREAK id={break_id} score={by_position[position]}]\n")
+        last = position
+    parts.append(text[last:])
+    return "".join(parts)
+
+
+def _process_segment(
+    text: str,
+    prompt: str,
+    max_tokens: int = 16000,
+    json_output: bool = False,
+    max_retries: int = 5,
+) -> str:
+    """Process a single segment with GPT-4o, with retry logic for rate limits."""
+    options = {"response_format": {"type": "json_object"}} if json_output else {}
+    with metrics.track("openai", "score_breaks") as call:
+        for attempt in range(max_retries):
+            try:
+                with _limiter:
+                    response = _client.chat.completions.create(
+                        model="gpt-4o",
+                        messages=[
+                            {"role": "system", "content": prompt},
+                            {"role": "user", "content": text},
+                        ],
+                        temperature=0.1,
+                        max_tokens=max_tokens,
+                        **options,
+                    )
+                _limiter.succeeded()
+                result = response.choices[0].message.content
+                call.bytes_sent = metrics.text_size(prompt, text)
+                call.bytes_received = metrics.text_size(result)
+                return result
+            except Exception as e:
+                err_msg = str(e).lower()
+                is_rate_limit = any(
+                    s in err_msg
+                    for s in ["rate", "resource", "exhausted", "429", "quota", "limit"]
+                )
+                if is_rate_limit and attempt < max_retries - 1:
+                    _limiter.rate_limited()
+                    wait_time = (attempt + 1) * 15  # 15s, 30s, 45s, 60s
+                    call.retries += 1
+                    time.sleep(wait_time)
+                    metrics.record_wait("openai", wait_time)
+                else:
+                    raise
@@ -5,98 +5,141 @@ Step 4: Deterministic cleanup (no LLM).
 - Removes [PAGE X] markers
 - Removes code block UI artifacts
 - Resequences break IDs
+
+Markers are handled in one scan with a single compiled pattern, and the
+page mapping is recorded in the coordinates of the cleaned text (the text
+chunking sees), from the output position reached at each [PAGE X] marker.
+Code artifacts are then removed only in short windows around each fence.
 """
 
 import re
-from dataclasses import dataclass
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+
+# UI artifacts that appear on the line before or after a code fence
+_ARTIFACTS = (
+    "content_copy",
+    "expand_less",
+    "expand_more",
+    "code ",
+    "Python\n",
+    "JavaScript\n",
+)
+# Applied in order, before and after patterns for each artifact in turn
+_ARTIFACT_PATTERNS = [
+    (re.compile(rf"{re.escape(a)}\s*\n```"), re.compile(rf"```\n{re.escape(a)}"))
+    for a in _ARTIFACTS
+]
+_MAX_ARTIFACT_CHARS = max(len(a) for a in _ARTIFACTS)
+# Reach of the after patterns: one artifact per pass after the fence
+_AFTER_FENCE_CHARS = 3 + len(_ARTIFACTS) * (1 + _MAX_ARTIFACT_CHARS)
+
+_MARKER_PATTERN = re.compile(r"\[PAGE (?P<page>\d+)\]\n?|\[BREAK id=\d+ score=(?P<score>\d+)\]")
 
 
 @dataclass
 class PageMapping:
     """Maps character ranges to source pages."""
 
-    ranges: list[tuple[int, int, int]]  # (start_char, end_char, page_num)
+    # (start_char, end_char, page_num), sorted and non-overlapping
+    ranges: list[tuple[int, int, int]]
+    _starts: list[int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._starts = [start for start, _, _ in self.ranges]
 
     def get_pages_for_range(self, start: int, end: int) -> str:
         """Get page range string for a character range."""
-        pages = set()
-        for range_start, range_end, page in self.ranges:
-            if range_start < end and range_end > start:
-                pages.add(page)
+        # Ranges overlapping [start, end): from the one containing start (or
+        # the first after it) to the last one starting before end
+        first = max(0, bisect_right(self._starts, start) - 1)
+        if first < len(self.ranges) and self.ranges[first][1] <= start:
+            first += 1
+        last = bisect_left(self._starts, end)
+        pages = [page for _, _, page in self.ranges[first:last]]
 
         if not pages:
             return ""
 
-        pages_list = sorted(pages)
-        if len(pages_list) == 1:
-            return str(pages_list[0])
-        return f"{pages_list[0]}-{pages_list[-1]}"
-
-
-def _build_page_mapping(text: str) -> PageMapping:
-    """Build a mapping from character positions to page numbers."""
-    ranges = []
-    pattern = r"\[PAGE (\d+)\]"
-
-    current_page = 1
-    last_end = 0
-
-    for match in re.finditer(pattern, text):
-        page_num = int(match.group(1))
-        marker_start = match.start()
-
-        # Record range for previous page
-        if marker_start > last_end:
-            ranges.append((last_end, marker_start, current_page))
-
-        current_page = page_num
-        last_end = match.end()
-
-    # Record final range
-    if last_end < len(text):
-        ranges.append((last_end, len(text), current_page))
-
-    return PageMapping(ranges)
+        low, high = min(pages), max(pages)
+        if low == high:
+            return str(low)
+        return f"{low}-{high}"
 
 
-def _remove_page_markers(text: str) -> str:
-    """Remove [PAGE X] markers."""
-    return re.sub(r"\[PAGE \d+\]\n?", "", text)
+def _window_start(text: str, fence: int) -> int:
+    """Earliest position an artifact pattern ending at this fence can start."""
+    start = fence
+    for _ in _ARTIFACTS:
+        while start > 0 and text[start - 1].isspace():
+            start -= 1
+        start = max(0, start - _MAX_ARTIFACT_CHARS)
+    return start
 
 
-def _remove_code_artifacts(text: str) -> str:
-    """Remove UI artifacts that appear around code blocks."""
-    artifacts = [
-        "content_copy",
-        "expand_less",
-        "expand_more",
-        "code ",
-        "Python\n",
-        "JavaScript\n",
-    ]
-
-    result = text
-    for artifact in artifacts:
-        # Remove artifacts that appear on lines adjacent to code fences
-        # Pattern: artifact followed by optional whitespace and newline before ```
-        result = re.sub(rf"{re.escape(artifact)}\s*\n```", "```", result)
-        # Pattern: ``` followed by newline and artifact
-        result = re.sub(rf"```\n{re.escape(artifact)}", "```", result)
-
-    return result
-
-
-def _resequence_breaks(text: str) -> str:
-    """Renumber all break IDs sequentially from 1."""
-    pattern = r"\[BREAK id=\d+ score=(\d+)\]"
-    counter = [0]
+def _remove_code_artifacts(text: str) -> tuple[str, list[tuple[int, int, int]]]:
+    """
+    Remove UI artifacts that appear around code blocks.
 
-    def replace_fn(match):
-        counter[0] += 1
-        score = match.group(1)
-        return f"[BREAK id={counter[0]} score={score}]"
+    Every match touches a fence, so the per-artifact passes only run on the
+    (merged) windows around fences.
 
-    return re.sub(pattern, replace_fn, text)
+    Returns:
+        Tuple of (text, edits), with an edit (start, end, new_length) for
+        each window that changed
+    """
+    windows = []
+    fence = text.find("```")
+    while fence != -1:
+        start, end = _window_start(text, fence), min(len(text), fence + _AFTER_FENCE_CHARS)
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = end
+        else:
+            windows.append([start, end])
+        fence = text.find("```", fence + 1)
+
+    parts = []
+    edits = []
+    last = 0
+    for start, end in windows:
+        segment = text[start:end]
+        for before, after in _ARTIFACT_PATTERNS:
+            segment = before.sub("```", segment)
+            segment = after.sub("```", segment)
+        if len(segment) != end - start:
+            parts.append(text[last:start])
+            parts.append(segment)
+            last = end
+            edits.append((start, end, len(segment)))
+
+    if not edits:
+        return text, edits
+    parts.append(text[last:])
+    return "".join(parts), edits
+
+
+def _remap(ranges: list[tuple[int, int, int]], edits: list[tuple[int, int, int]]) -> list:
+    """Move page ranges past the removed artifacts."""
+    index = removed = 0
+
+    def move(position: int) -> int:
+        nonlocal index, removed
+        while index < len(edits) and edits[index][1] <= position:
+            start, end, length = edits[index]
+            removed += end - start - length
+            index += 1
+        if index < len(edits) and edits[index][0] < position:
+            # Inside a changed window: the removed text comes first
+            start, end, length = edits[index]
+            return position - removed - min(end - start - length, position - start)
+        return position - removed
+
+    remapped = []
+    for start, end, page in ranges:
+        start, end = move(start), move(end)
+        if end > start:
+            remapped.append((start, end, page))
+    return remapped
 
 
 def cleanup(text: str) -> tuple[str, PageMapping]:
@@ -106,16 +149,41 @@ def cleanup(text: str) -> tuple[str, PageMapping]:
     Returns:
         Tuple of (cleaned_text, page_mapping)
     """
-    # 1. Build page mapping before removing markers
-    page_mapping = _build_page_mapping(text)
-
-    # 2. Remove page markers
-    text = _remove_page_markers(text)
-
-    # 3. Remove code block artifacts
-    text = _remove_code_artifacts(text)
-
-    # 4. Resequence break IDs
-    text = _resequence_breaks(text)
+    parts = []
+    ranges = []
+    position = 0  # In the text without markers
+    last = 0  # In the input text
+    current_page = 1
+    page_start = 0
+    break_id = 0
+
+    for match in _MARKER_PATTERN.finditer(text):
+        parts.append(text[last : match.start()])
+        position += match.start() - last
+        last = match.end()
+
+        if match.group("page") is not None:
+            # Record range for previous page
+            if position > page_start:
+                ranges.append((page_start, position, current_page))
+            current_page = int(match.group("page"))
+            page_start = position
+        else:
+            break_id += 1
+            marker = f"[BREAK id={break_id} score={match.group('score')}]"
+            parts.append(marker)
+            position += len(marker)
+
+    parts.append(text[last:])
+    position += len(text) - last
 
-    return text, page_mapping
+    # Record final range
+    if position > page_start:
+        ranges.append((page_start, position, current_page))
+
+    # Artifacts are matched once the page markers between them and a fence
+    # are gone
+    text, edits = _remove_code_artifacts("".join(parts))
+    if edits:
+        ranges = _remap(ranges, edits)
+    return text, PageMapping(ranges)
@@ -0,0 +1,119 @@
+"""
+Parsed PDF shared by the steps of one ingestion job.
+
+Upload, extraction, text-layer classification and image cropping used to
+each parse the PDF bytes again (and cropping reopened the whole document
+for every graphic). A PDFDocument is opened once per job, passed from the
+upload handler through process_document to every step, and closed when
+the pipeline finishes.
+
+The parsers (pypdf for page objects and splitting, pdfplumber for layout,
+pdfium for rendering) are created on first use, each on its own handle
+to the file; one more handle serves the raw bytes for whole-file uploads.
+The handles are opened up front, so the document stays readable if the
+file is later renamed (spooled) or evicted. None of the
+parsers is thread-safe: hold `lock` while using `reader` or `plumber`
+directly; the helper methods lock for you.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import BinaryIO
+
+import pdfplumber
+import pypdfium2
+from PIL import Image
+from pypdf import PdfReader
+
+
+class PDFDocument:
+    """One PDF file, parsed lazily and at most once per parser."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock = threading.RLock()
+        self._files = {
+            name: open(self.path, "rb") for name in ("pypdf", "pdfplumber", "pdfium", "raw")
+        }
+        self._reader: PdfReader | None = None
+        self._plumber: pdfplumber.PDF | None = None
+        self._pdfium: pypdfium2.PdfDocument | None = None
+
+    def __enter__(self) -> "PDFDocument":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def reader(self) -> PdfReader:
+        """pypdf reader (page objects, splitting). Hold `lock` while using it."""
+        with self.lock:
+            if self._reader is None:
+                self._reader = PdfReader(self._files["pypdf"])
+            return self._reader
+
+    @property
+    def plumber(self) -> pdfplumber.PDF:
+        """pdfplumber document (chars, lines, images). Hold `lock` while using it."""
+        with self.lock:
+            if self._plumber is None:
+                self._plumber = pdfplumber.open(self._files["pdfplumber"])
+            return self._plumber
+
+    def _pdfium_page(self, page_num: int) -> pypdfium2.PdfPage:
+        if self._pdfium is None:
+            self._pdfium = pypdfium2.PdfDocument(self._files["pdfium"])
+        return self._pdfium[page_num - 1]
+
+    def raw_file(self) -> tuple[BinaryIO, int]:
+        """
+        The file itself, rewound, and its size (e.g. to upload it whole).
+
+        The handle is not used by any parser, but is shared: read it from
+        one thread at a time.
+        """
+        f = self._files["raw"]
+        f.seek(0)
+        return f, os.fstat(f.fileno()).st_size
+
+    @property
+    def page_count(self) -> int:
+        with self.lock:
+            return len(self.reader.pages)
+
+    def _check_page(self, page_num: int) -> None:
+        if page_num < 1 or page_num > self.page_count:
+            raise ValueError(f"Invalid page number: {page_num}")
+
+    def page_size(self, page_num: int) -> tuple[float, float]:
+        """(width, height) of a 1-indexed page in PDF points, as displayed."""
+        with self.lock:
+            self._check_page(page_num)
+            page = self.reader.pages[page_num - 1]
+            width, height = float(page.cropbox.width), float(page.cropbox.height)
+            if page.rotation % 180:
+                width, height = height, width
+            return width, height
+
+    def render(self, page_num: int, resolution: int) -> Image.Image:
+        """Render a 1-indexed page at `resolution` DPI."""
+        with self.lock:
+            self._check_page(page_num)
+            page = self._pdfium_page(page_num)
+            try:
+                return page.render(scale=resolution / 72).to_pil()
+            finally:
+                page.close()
+
+    def close(self) -> None:
+        """Release the parsers and file handles."""
+        with self.lock:
+            if self._plumber is not None:
+                self._plumber.close()
+            if self._pdfium is not None:
+                self._pdfium.close()
+            for f in self._files.values():
+                f.close()
+            self._reader = self._plumber = self._pdfium = None
@@ -1,42 +1,70 @@
 """
 Step 2: PDF text extraction using Gemini.
 
-Extracts text from PDF in 5-page batches, sequentially.
-Returns a master text string with [PAGE X] markers.
+Pages with a clean text layer and a simple layout are extracted locally
+(pipeline/text_layer.py), and pages extracted before (same content, prompt
+and model) come from the extraction cache (services/extraction_cache.py).
+The rest go to Gemini in batches of consecutive pages sized from each
+page's density (text-layer length, images, rulings) to fit the output
+token budget, several at a time under an adaptive (AIMD) concurrency
+limit that backs off when Gemini rate limits. A batch that still hits
+the output token limit is split in half and retried.
+
+By default the whole PDF is uploaded to the Gemini File API once per
+document and each batch request names its page range; per-batch sub-PDF
+uploads remain the fallback (EXTRACTION_UPLOAD_MODE=batch, very long
+documents, or a failed full-document upload or request).
+Returns a master text string with [PAGE X] markers, in page order.
 """
 
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
+from typing import BinaryIO
 
 import google.generativeai as genai
 from pypdf import PdfReader, PdfWriter
 
 import config
+from services import extraction_cache, metrics
+from pipeline import text_layer
+from pipeline.document import PDFDocument
+from services.ratelimit import AdaptiveConcurrency
 
 logger = logging.getLogger(__name__)
 
 # Configure Gemini
 genai.configure(api_key=config.GEMINI_API_KEY)
 
-# Load extraction prompt template
+# Gemini calls in flight, shared by every document being processed
+_limiter = AdaptiveConcurrency(
+    initial=config.EXTRACTION_CONCURRENCY,
+    maximum=config.EXTRACTION_MAX_CONCURRENCY,
+)
+
+# Gemini 2.0 Flash (current best model with PDF support)
+_MODEL = "gemini-2.0-flash"
+
+# Load extraction prompt templates
 _PROMPT_PATH = Path(__file__).parent.parent / "docs" / "prompts" / "extraction.md"
-_PROMPT_TEMPLATE = None
+# Appended in full-document mode, where each request addresses a page range
+_PAGE_RANGE_PROMPT_PATH = _PROMPT_PATH.with_name("extraction-page-range.md")
+_PROMPT_TEMPLATES: dict[Path, str] = {}
 
 
-def _load_prompt() -> str:
-    """Load and cache the extraction prompt template."""
-    global _PROMPT_TEMPLATE
-    if _PROMPT_TEMPLATE is None:
-        content = _PROMPT_PATH.read_text()
+def _load_prompt(path: Path = _PROMPT_PATH) -> str:
+    """Load and cache a prompt template."""
+    if path not in _PROMPT_TEMPLATES:
+        content = path.read_text()
         # Extract just the prompt between the code fence
         lines = content.split("```")[1].strip()
         # Remove the first line if it's just a language identifier
         if lines.startswith("\n"):
             lines = lines[1:]
-        _PROMPT_TEMPLATE = lines
-    return _PROMPT_TEMPLATE
+        _PROMPT_TEMPLATES[path] = lines
+    return _PROMPT_TEMPLATES[path]
 
 
 def _create_batch_pdf(reader: PdfReader, start_idx: int, end_idx: int) -> bytes:
@@ -50,57 +78,284 @@ def _create_batch_pdf(reader: PdfReader, start_idx: int, end_idx: int) -> bytes:
     return buffer.getvalue()
 
 
-def extract_pdf(pdf_content: bytes, batch_size: int = 5) -> str:
+# Output token estimates per page, used to size batches
+_CHARS_PER_TOKEN = 4
+_PAGE_TOKENS = 200  # Markers, headings, formatting
+_UNKNOWN_PAGE_TOKENS = 1500  # Scanned page (no text layer to measure)
+_IMAGE_TOKENS = 500  # A GRAPHIC_INSERT block with its description
+_MAX_IMAGES_COUNTED = 4
+_TABLE_FACTOR = 1.5  # Table markup on ruled pages
+
+
+class _OutputTruncated(Exception):
+    """Gemini stopped at max_output_tokens; `text` is the partial output."""
+
+    def __init__(self, text: str):
+        super().__init__("Output truncated at max_output_tokens")
+        self.text = text
+
+
+def _estimate_tokens(page: text_layer.PageAnalysis | None) -> int:
+    """Rough output tokens for extracting one page."""
+    if page is None:
+        return _UNKNOWN_PAGE_TOKENS
+    if page.text_chars < text_layer.MIN_TEXT_CHARS:
+        # Scanned or mostly graphical: the text layer says little
+        tokens = _UNKNOWN_PAGE_TOKENS
+    else:
+        tokens = _PAGE_TOKENS + page.text_chars // _CHARS_PER_TOKEN
+    if page.rulings > text_layer.MAX_RULINGS:
+        tokens = int(tokens * _TABLE_FACTOR)
+    return tokens + min(page.images, _MAX_IMAGES_COUNTED) * _IMAGE_TOKENS
+
+
+def _llm_batches(pages: list[int], estimates: dict[int, int]) -> list[tuple[int, int]]:
+    """
+    Group 0-indexed page numbers into batches of consecutive pages.
+
+    A batch grows until its estimated output would exceed
+    EXTRACTION_BATCH_TOKENS or it reaches EXTRACTION_MAX_BATCH_PAGES.
+    Returns (start, end) pairs, end exclusive.
+    """
+    batches: list[tuple[int, int]] = []
+    tokens = 0
+    for page in pages:
+        if (
+            batches
+            and batches[-1][1] == page
+            and page - batches[-1][0] < config.EXTRACTION_MAX_BATCH_PAGES
+            and tokens + estimates[page] <= config.EXTRACTION_BATCH_TOKENS
+        ):
+            batches[-1] = (batches[-1][0], page + 1)
+            tokens += estimates[page]
+        else:
+            batches.append((page, page + 1))
+            tokens = estimates[page]
+    return batches
+
+
+def extract_pdf(document: PDFDocument) -> str:
     """
-    Extract text from PDF using Gemini.
+    Extract text from PDF, locally where the text layer allows, else with Gemini.
+
+    Gemini batches run concurrently, up to the adaptive limit of
+    `_limiter`, and everything is joined in page order.
 
     Args:
-        pdf_content: Raw PDF bytes
-        batch_size: Pages per batch (default 5)
+        document: The parsed PDF
 
     Returns:
         Master text string with all extracted content
     """
-    reader = PdfReader(BytesIO(pdf_content))
-    total_pages = len(reader.pages)
+    total_pages = document.page_count
 
-    # Use Gemini 2.0 Flash (current best model with PDF support)
-    model = genai.GenerativeModel("gemini-2.0-flash")
+    # Page classification: local extraction and batch sizing (only the
+    # sizing measurements when the fast path is off)
+    analyses = text_layer.analyze(document, local=config.TEXT_LAYER_FAST_PATH)
+    local_texts: dict[int, str] = {}
+    if config.TEXT_LAYER_FAST_PATH:
+        local_texts = text_layer.extract_local_pages(analyses)
+        hard = [a for a in analyses if not a.local]
+        reasons = ", ".join(sorted({a.reason for a in hard}))
+        logger.info(
+            f"Text layer: {len(local_texts)}/{total_pages} pages extracted locally"
+            + (f"; {len(hard)} sent to Gemini ({reasons})" if hard else "")
+        )
 
-    master_text_parts = []
+    model = genai.GenerativeModel(_MODEL)
     prompt_template = _load_prompt()
 
-    # Process in batches
-    total_batches = (total_pages + batch_size - 1) // batch_size
-    for batch_idx, batch_start in enumerate(range(0, total_pages, batch_size)):
-        batch_end = min(batch_start + batch_size, total_pages)
-        batch_label = f"batch {batch_idx + 1}/{total_batches} (pages {batch_start + 1}-{batch_end})"
+    llm_pages = [i for i in range(total_pages) if i + 1 not in local_texts]
+    cache_keys: dict[int, str] = {}  # 1-indexed page -> key
+    cached_texts: dict[int, str] = {}
+    if config.EXTRACTION_CACHE and llm_pages:
+        # Key on the prompt as sent: in document upload mode that includes
+        # the page-range addendum, so editing either template or switching
+        # EXTRACTION_UPLOAD_MODE invalidates entries
+        cache_prompt = prompt_template
+        if config.EXTRACTION_UPLOAD_MODE == "document":
+            cache_prompt += "\n\n" + _load_prompt(_PAGE_RANGE_PROMPT_PATH)
+        memo = {}
+        with document.lock:
+            cache_keys = {
+                i + 1: extraction_cache.page_key(
+                    document.reader.pages[i], cache_prompt, _MODEL, memo
+                )
+                for i in llm_pages
+            }
+        cached_texts = extraction_cache.get_pages(cache_keys)
+        logger.info(f"Extraction cache: {len(cached_texts)}/{len(llm_pages)} pages hit")
+        llm_pages = [i for i in llm_pages if i + 1 not in cached_texts]
+
+    estimates = {
+        i: _estimate_tokens(analyses[i] if i < len(analyses) else None) for i in llm_pages
+    }
+    batches = _llm_batches(llm_pages, estimates)
+
+    # Upload the whole PDF once and address page ranges in each prompt,
+    # instead of writing and uploading a sub-PDF per batch
+    full_file = None
+    if (
+        config.EXTRACTION_UPLOAD_MODE == "document"
+        and len(batches) > 1
+        and total_pages <= config.EXTRACTION_DOCUMENT_MAX_PAGES
+    ):
+        try:
+            source, size = document.raw_file()
+            full_file = _upload_file(source, size, "document.pdf")
+        except Exception as e:
+            logger.warning(f"Full-document upload failed, uploading per batch: {e}")
+
+    def extract_range(batch_start: int, batch_end: int) -> str:
+        batch_label = f"pages {batch_start + 1}-{batch_end}"
+        prompt = _batch_prompt(prompt_template, batch_start, batch_end)
+        try:
+            extracted = None
+            if full_file is not None:
+                try:
+                    extracted = _extract_batch(
+                        model,
+                        prompt + "\n\n" + _page_range_prompt(batch_start, batch_end, total_pages),
+                        full_file,
+                        batch_label,
+                    )
+                except _OutputTruncated:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Full-document request failed for {batch_label}, "
+                                   f"uploading the batch instead: {e}")
+            if extracted is None:
+                with document.lock:
+                    batch_pdf = _create_batch_pdf(document.reader, batch_start, batch_end)
+                pdf_file = _upload_file(
+                    BytesIO(batch_pdf), len(batch_pdf), f"batch_{batch_start + 1}_{batch_end}.pdf"
+                )
+                try:
+                    extracted = _extract_batch(model, prompt, pdf_file, batch_label)
+                finally:
+                    _delete_file(pdf_file)
+        except _OutputTruncated as e:
+            if batch_end - batch_start == 1:
+                # Can't split a single page further; keep what was produced
+                logger.warning(f"Page {batch_end} output truncated at max_output_tokens")
+                return e.text
+            middle = (batch_start + batch_end) // 2
+            logger.warning(
+                f"Pages {batch_start + 1}-{batch_end} hit max_output_tokens, "
+                f"retrying as {batch_start + 1}-{middle} and {middle + 1}-{batch_end}"
+            )
+            return "\n\n".join(
+                [extract_range(batch_start, middle), extract_range(middle, batch_end)]
+            )
+        if cache_keys:
+            keys = {page: cache_keys[page] for page in range(batch_start + 1, batch_end + 1)}
+            extraction_cache.put_pages(keys, extracted)
+        return extracted
+
+    def extract_batch(batch: tuple[int, int]) -> str:
+        return extract_range(*batch)
 
-        # Brief pause between batches to spread out Gemini API calls
-        if batch_idx > 0:
-            time.sleep(1)
+    workers = min(config.EXTRACTION_MAX_CONCURRENCY, len(batches)) or 1
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map() yields results in submission (page) order
+            llm_texts = dict(zip(
+                (start for start, _ in batches),
+                executor.map(metrics.propagate(extract_batch), batches),
+            ))
+    finally:
+        if full_file is not None:
+            _delete_file(full_file)
+
+    # Local pages, cached pages and Gemini batches, in page order
+    master_text_parts = []
+    for page in range(total_pages):
+        if page + 1 in local_texts:
+            master_text_parts.append(local_texts[page + 1])
+        elif page + 1 in cached_texts:
+            master_text_parts.append(cached_texts[page + 1])
+        elif page in llm_texts:
+            master_text_parts.append(llm_texts[page])
+
+    return "\n\n".join(master_text_parts)
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    err_msg = str(error).lower()
+    return any(s in err_msg for s in ["rate", "resource", "exhausted", "429", "quota"])
+
+
+def _hit_token_limit(response) -> bool:
+    """True if generation stopped at max_output_tokens."""
+    if not response.candidates:
+        return False
+    reason = response.candidates[0].finish_reason
+    return getattr(reason, "name", reason) == "MAX_TOKENS"
 
-        # Create batch PDF
-        batch_pdf = _create_batch_pdf(reader, batch_start, batch_end)
 
-        # Format prompt with page numbers (1-indexed for display)
-        prompt = prompt_template.replace("{start_page}", str(batch_start + 1))
-        prompt = prompt.replace("{end_page}", str(batch_end))
+def _strip_batch_markers(extracted: str) -> str:
+    """Strip batch markers if present."""
+    if "==START OF EXTRACTION BATCH==" in extracted:
+        extracted = extracted.split("==START OF EXTRACTION BATCH==")[1]
+    if "==END OF EXTRACTION BATCH==" in extracted:
+        extracted = extracted.split("==END OF EXTRACTION BATCH==")[0]
+    return extracted.strip()
 
-        # Upload PDF to Gemini
+
+def _batch_prompt(prompt_template: str, batch_start: int, batch_end: int) -> str:
+    """Format the prompt with page numbers (1-indexed for display)."""
+    prompt = prompt_template.replace("{start_page}", str(batch_start + 1))
+    return prompt.replace("{end_page}", str(batch_end))
+
+
+def _page_range_prompt(batch_start: int, batch_end: int, total_pages: int) -> str:
+    """Addendum telling Gemini which pages of the full document to extract."""
+    prompt = _load_prompt(_PAGE_RANGE_PROMPT_PATH)
+    prompt = prompt.replace("{start_page}", str(batch_start + 1))
+    prompt = prompt.replace("{end_page}", str(batch_end))
+    return prompt.replace("{total_pages}", str(total_pages))
+
+
+def _upload_file(source: BinaryIO, size: int, display_name: str):
+    """Upload a PDF to the Gemini File API."""
+    with metrics.track("gemini", "upload_file") as call:
         pdf_file = genai.upload_file(
-            BytesIO(batch_pdf),
+            source,
             mime_type="application/pdf",
-            display_name=f"batch_{batch_start + 1}_{batch_end}.pdf",
+            display_name=display_name,
         )
+        call.bytes_sent = size
+    return pdf_file
 
-        # Generate extraction with retry logic for rate limits
-        max_retries = 5
-        extracted = None
 
-        try:
-            for attempt in range(max_retries):
-                try:
+def _delete_file(pdf_file) -> None:
+    """Delete an uploaded file (best effort; Gemini expires files anyway)."""
+    try:
+        with metrics.track("gemini", "delete_file"):
+            genai.delete_file(pdf_file.name)
+    except Exception:
+        pass
+
+
+def _extract_batch(
+    model: genai.GenerativeModel,
+    prompt: str,
+    pdf_file,
+    batch_label: str,
+) -> str:
+    """
+    Extract one batch of pages from an uploaded PDF with Gemini.
+
+    Raises _OutputTruncated if the output hit max_output_tokens.
+    """
+    # Generate extraction with retry logic for rate limits
+    max_retries = 5
+    extracted = None
+
+    with metrics.track("gemini", "generate_content") as call:
+        for attempt in range(max_retries):
+            try:
+                with _limiter:
                     response = model.generate_content(
                         [prompt, pdf_file],
                         generation_config=genai.GenerationConfig(
@@ -108,42 +363,33 @@ def extract_pdf(pdf_content: bytes, batch_size: int = 5) -> str:
                             max_output_tokens=32000,
                         ),
                     )
-                    extracted = response.text
-                    logger.info(f"Extracted {batch_label}")
-                    break
-                except Exception as e:
-                    err_msg = str(e).lower()
-                    is_rate_limit = any(
-                        s in err_msg
-                        for s in ["rate", "resource", "exhausted", "429", "quota"]
+                _limiter.succeeded()
+                extracted = response.text
+                call.bytes_sent = metrics.text_size(prompt)
+                call.bytes_received = metrics.text_size(extracted)
+                truncated = _hit_token_limit(response)
+                logger.info(f"Extracted {batch_label}")
+                break
+            except Exception as e:
+                if _is_rate_limit(e) and attempt < max_retries - 1:
+                    # Fewer batches in flight, then wait before retrying
+                    _limiter.rate_limited()
+                    wait_time = (attempt + 1) * 15  # 15s, 30s, 45s, 60s
+                    logger.warning(
+                        f"Rate limited on {batch_label}, "
+                        f"attempt {attempt + 1}/{max_retries}, "
+                        f"concurrency now {_limiter.limit}, "
+                        f"waiting {wait_time}s"
                     )
-                    if is_rate_limit and attempt < max_retries - 1:
-                        wait_time = (attempt + 1) * 15  # 15s, 30s, 45s, 60s
-                        logger.warning(
-                            f"Rate limited on {batch_label}, "
-                            f"attempt {attempt + 1}/{max_retries}, "
-                            f"waiting {wait_time}s"
-                        )
-                        time.sleep(wait_time)
-                    else:
-                        raise
-
-            if extracted is None:
-                raise RuntimeError(f"Failed to extract {batch_label}")
-
-            # Strip batch markers if present
-            if "==START OF EXTRACTION BATCH==" in extracted:
-                extracted = extracted.split("==START OF EXTRACTION BATCH==")[1]
-            if "==END OF EXTRACTION BATCH==" in extracted:
-                extracted = extracted.split("==END OF EXTRACTION BATCH==")[0]
+                    call.retries += 1
+                    time.sleep(wait_time)
+                    metrics.record_wait("gemini", wait_time)
+                else:
+                    raise
 
-            master_text_parts.append(extracted.strip())
+    if extracted is None:
+        raise RuntimeError(f"Failed to extract {batch_label}")
+    if truncated:
+        raise _OutputTruncated(_strip_batch_markers(extracted))
 
-        finally:
-            # Clean up uploaded file
-            try:
-                genai.delete_file(pdf_file.name)
-            except Exception:
-                pass  # Best effort cleanup
-
-    return "\n\n".join(master_text_parts)
+    return _strip_batch_markers(extracted)
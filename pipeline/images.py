@@ -1,7 +1,9 @@
 """
-Step 6: Image cropping using pdfplumber.
+Step 6: Image cropping.
 
-Crops graphics from PDF pages based on GRAPHIC_INSERT coordinates.
+Crops graphics from PDF pages based on GRAPHIC_INSERT coordinates. Pages
+are rendered from the job's shared PDFDocument (pipeline/document.py);
+rendering is serialised on its lock, uploads run in parallel.
 """
 
 import json
@@ -9,10 +11,10 @@ import re
 from io import BytesIO
 from concurrent.futures import ThreadPoolExecutor
 
-import pdfplumber
 from PIL import Image
 
-from services import gcs
+from pipeline.document import PDFDocument
+from services import gcs, metrics
 
 # Coordinate conversion: PDF points (72 DPI) to 300 DPI render
 DPI_SCALE = 300 / 72
@@ -31,37 +33,32 @@ def _parse_graphic_insert(content: str) -> dict | None:
         return None
 
 
-def render_full_page(pdf_content: bytes, page_num: int) -> bytes:
+def render_full_page(document: PDFDocument, page_num: int) -> bytes:
     """
     Render a full PDF page as PNG.
 
     Args:
-        pdf_content: Raw PDF bytes
+        document: The parsed PDF
         page_num: 1-indexed page number
 
     Returns:
         PNG image bytes
     """
-    with pdfplumber.open(BytesIO(pdf_content)) as pdf:
-        if page_num < 1 or page_num > len(pdf.pages):
-            raise ValueError(f"Invalid page number: {page_num}")
+    img = document.render(page_num, resolution=150)  # Lower res for full pages
 
-        page = pdf.pages[page_num - 1]
-        img = page.to_image(resolution=150)  # Lower res for full pages
-
-        buffer = BytesIO()
-        img.original.save(buffer, format="PNG")
-        return buffer.getvalue()
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
 
 
 def crop_image(
-    pdf_content: bytes, page_num: int, coords: list[float], graphic_id: str
+    document: PDFDocument, page_num: int, coords: list[float], graphic_id: str
 ) -> bytes:
     """
     Crop a region from a PDF page.
 
     Args:
-        pdf_content: Raw PDF bytes
+        document: The parsed PDF
         page_num: 1-indexed page number
         coords: [x0, y0, x1, y1] in PDF points (72 DPI)
         graphic_id: Unique identifier for the graphic
@@ -69,32 +66,26 @@ def crop_image(
     Returns:
         PNG image bytes
     """
-    with pdfplumber.open(BytesIO(pdf_content)) as pdf:
-        if page_num < 1 or page_num > len(pdf.pages):
-            raise ValueError(f"Invalid page number: {page_num}")
-
-        page = pdf.pages[page_num - 1]
-
-        # Render page at 300 DPI
-        img = page.to_image(resolution=300)
+    # Render page at 300 DPI
+    img = document.render(page_num, resolution=300)
 
-        # Convert coordinates from PDF points to pixels
-        x0 = int(coords[0] * DPI_SCALE)
-        y0 = int(coords[1] * DPI_SCALE)
-        x1 = int(coords[2] * DPI_SCALE)
-        y1 = int(coords[3] * DPI_SCALE)
+    # Convert coordinates from PDF points to pixels
+    x0 = int(coords[0] * DPI_SCALE)
+    y0 = int(coords[1] * DPI_SCALE)
+    x1 = int(coords[2] * DPI_SCALE)
+    y1 = int(coords[3] * DPI_SCALE)
 
-        # Crop the image
-        cropped = img.original.crop((x0, y0, x1, y1))
+    # Crop the image
+    cropped = img.crop((x0, y0, x1, y1))
 
-        # Convert to PNG bytes
-        buffer = BytesIO()
-        cropped.save(buffer, format="PNG")
-        return buffer.getvalue()
+    # Convert to PNG bytes
+    buffer = BytesIO()
+    cropped.save(buffer, format="PNG")
+    return buffer.getvalue()
 
 
 def process_graphic_chunk(
-    doc_id: str, pdf_content: bytes, chunk_content: str
+    doc_id: str, document: PDFDocument, chunk_content: str
 ) -> str | None:
     """
     Process a graphic chunk: crop image and upload to GCS.
@@ -102,7 +93,7 @@ def process_graphic_chunk(
 
     Args:
         doc_id: Document record ID
-        pdf_content: Raw PDF bytes
+        document: The parsed PDF
         chunk_content: Raw chunk content (GRAPHIC_INSERT block)
 
     Returns:
@@ -124,14 +115,14 @@ def process_graphic_chunk(
     # Try cropping first
     if coords:
         try:
-            image_bytes = crop_image(pdf_content, page_num, coords, graphic_id)
+            image_bytes = crop_image(document, page_num, coords, graphic_id)
         except Exception as e:
             print(f"Crop failed for {graphic_id}, falling back to full page: {e}")
 
     # Fallback to full page
     if image_bytes is None:
         try:
-            image_bytes = render_full_page(pdf_content, page_num)
+            image_bytes = render_full_page(document, page_num)
             graphic_id = f"page_{page_num}_fallback"
         except Exception as e:
             print(f"Full page render also failed for {graphic_id}: {e}")
@@ -147,14 +138,14 @@ def process_graphic_chunk(
 
 
 def process_all_graphics(
-    doc_id: str, pdf_content: bytes, chunks: list
+    doc_id: str, document: PDFDocument, chunks: list
 ) -> dict[int, str]:
     """
     Process all graphic chunks in parallel.
 
     Args:
         doc_id: Document record ID
-        pdf_content: Raw PDF bytes
+        document: The parsed PDF
         chunks: List of Chunk objects
 
     Returns:
@@ -167,35 +158,34 @@ def process_all_graphics(
 
     def process_one(item):
         seq_num, content = item
-        url = process_graphic_chunk(doc_id, pdf_content, content)
+        url = process_graphic_chunk(doc_id, document, content)
         return seq_num, url
 
     results = {}
     with ThreadPoolExecutor(max_workers=5) as executor:
-        for seq_num, url in executor.map(process_one, graphic_chunks):
+        for seq_num, url in executor.map(metrics.propagate(process_one), graphic_chunks):
             if url:
                 results[seq_num] = url
 
     return results
 
 
-def save_all_pages(doc_id: str, pdf_content: bytes) -> dict[int, str]:
+def save_all_pages(doc_id: str, document: PDFDocument) -> dict[int, str]:
     """
     Save all PDF pages as images for citation previews.
 
     Args:
         doc_id: Document record ID
-        pdf_content: Raw PDF bytes
+        document: The parsed PDF
 
     Returns:
         Dict mapping page number (1-indexed) to GCS URL
     """
-    with pdfplumber.open(BytesIO(pdf_content)) as pdf:
-        total_pages = len(pdf.pages)
+    total_pages = document.page_count
 
     def render_and_upload(page_num: int) -> tuple[int, str | None]:
         try:
-            image_bytes = render_full_page(pdf_content, page_num)
+            image_bytes = render_full_page(document, page_num)
             url = gcs.upload_image(doc_id, f"page_{page_num}", image_bytes)
             return page_num, url
         except Exception as e:
@@ -204,7 +194,7 @@ def save_all_pages(doc_id: str, pdf_content: bytes) -> dict[int, str]:
 
     results = {}
     with ThreadPoolExecutor(max_workers=5) as executor:
-        for page_num, url in executor.map(render_and_upload, range(1, total_pages + 1)):
+        for page_num, url in executor.map(metrics.propagate(render_and_upload), range(1, total_pages + 1)):
             if url:
                 results[page_num] = url
 
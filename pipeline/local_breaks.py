@@ -0,0 +1,171 @@
+"""
+Step 3 (local mode): Break scoring from document structure, without GPT-4o.
+
+For bulk backfills and low-value documents, where slightly worse chunk
+boundaries are an acceptable price for skipping the GPT-4o pass. The
+boundaries between paragraphs (as split by breaks._paragraphs) are scored
+on the break-scoring prompt's scale from structural signals:
+
+- 100 before a level 1-2 heading, and before and after GRAPHIC_INSERT,
+  TABLE and code blocks; 80 before deeper headings
+- no break after a heading (it stays with what it introduces), or where
+  a sentence runs on across a page transition (omitted boundaries are
+  never split)
+- 40 within a list and after a paragraph introducing the next (ending ":")
+- elsewhere 60, or 80 / 40 where lexical cohesion (word overlap of the
+  paragraphs on either side) drops sharply / stays high; a page
+  transition raises 40 to 60
+"""
+
+import math
+import re
+import statistics
+from collections import Counter
+
+# Paragraphs on each side of a boundary compared for lexical cohesion
+_COHESION_WINDOW = 3
+
+_PAGE_MARKERS = re.compile(r"^(?:\[PAGE \d+\]\s*)+")
+_HEADING = re.compile(r"^(#{1,6})\s+\S")
+_BLOCK_STARTS = ("```", "%%% GRAPHIC_INSERT %%%", "%%% TABLE_START")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+•]|\d+[.)])\s+\S")
+_SENTENCE_END = re.compile(r"[.!?:;\"')\]]$")
+_WORD = re.compile(r"[a-z]{3,}")
+_STOPWORDS = frozenset(
+    "the and for are but not you all any can had her was one our out has him his how its"
+    " may new now see two way who did get let say she too use that with have this will"
+    " your from they been were said each which their there would other into more some"
+    " than then them these what when where also such only over very just most must"
+    " should could about after before between both being under while through".split()
+)
+
+
+class _Paragraph:
+    """A paragraph's structural features."""
+
+    def __init__(self, text: str):
+        marker = _PAGE_MARKERS.match(text)
+        self.new_page = marker is not None
+        self.content = text[marker.end():] if marker else text
+
+        heading = _HEADING.match(self.content)
+        self.heading = len(heading.group(1)) if heading else 0
+        self.block = self.content.startswith(_BLOCK_STARTS)
+        lines = self.content.splitlines()
+        self.list = bool(lines) and all(_LIST_ITEM.match(line) for line in lines)
+        self.words = Counter(
+            word.removesuffix("s")
+            for word in _WORD.findall(self.content.lower())
+            if word not in _STOPWORDS
+        )
+
+
+def _cosine(a: Counter, b: Counter) -> float:
+    dot = sum(count * b[word] for word, count in a.items() if word in b)
+    if not dot:
+        return 0.0
+    norm = math.sqrt(sum(c * c for c in a.values())) * math.sqrt(sum(c * c for c in b.values()))
+    return dot / norm
+
+
+def _cohesion(paragraphs: list[_Paragraph]) -> list[float]:
+    """Similarity of the windows either side of each boundary (index i: before paragraph i)."""
+    similarities = [0.0]
+    for i in range(1, len(paragraphs)):
+        left, right = Counter(), Counter()
+        for p in paragraphs[max(0, i - _COHESION_WINDOW) : i]:
+            left.update(p.words)
+        for p in paragraphs[i : i + _COHESION_WINDOW]:
+            right.update(p.words)
+        similarities.append(_cosine(left, right))
+    return similarities
+
+
+def _depths(similarities: list[float]) -> list[float]:
+    """
+    How far similarity drops at each boundary below the nearest peaks on
+    either side (TextTiling depth scores).
+    """
+    depths = [0.0]
+    for i in range(1, len(similarities)):
+        left = i
+        while left > 1 and similarities[left - 1] >= similarities[left]:
+            left -= 1
+        right = i
+        while right + 1 < len(similarities) and similarities[right + 1] >= similarities[right]:
+            right += 1
+        depths.append(
+            (similarities[left] - similarities[i]) + (similarities[right] - similarities[i])
+        )
+    return depths
+
+
+def _merge_marker_paragraphs(text: str, spans: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Attach paragraphs holding only [PAGE X] markers to the paragraph after them."""
+    merged = []
+    pending = None
+    for start, end in spans:
+        if pending is None:
+            pending = start
+        if _PAGE_MARKERS.fullmatch(text[start:end].strip()) and (start, end) != spans[-1]:
+            continue
+        merged.append((pending, end))
+        pending = None
+    return merged
+
+
+def score_paragraphs(text: str, spans: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """
+    Score the boundaries between paragraphs.
+
+    Args:
+        text: Extracted text with [PAGE X] markers
+        spans: (start, end) of each paragraph, in order
+
+    Returns:
+        (position, score) breaks; a break's position is the start of the
+        paragraph it precedes
+    """
+    spans = _merge_marker_paragraphs(text, spans)
+    paragraphs = [_Paragraph(text[start:end]) for start, end in spans]
+    similarities = _cohesion(paragraphs)
+    depths = _depths(similarities)
+
+    # Cohesion is only compared between prose paragraphs
+    prose = [
+        i
+        for i in range(1, len(paragraphs))
+        if not (paragraphs[i - 1].heading or paragraphs[i - 1].block)
+        and not (paragraphs[i].heading or paragraphs[i].block)
+    ]
+    prose_depths = [depths[i] for i in prose]
+    drop = (
+        statistics.mean(prose_depths) + statistics.pstdev(prose_depths) if prose_depths else math.inf
+    )
+    high = statistics.median(similarities[i] for i in prose) if prose else math.inf
+
+    breaks = []
+    for i in range(1, len(paragraphs)):
+        before, after = paragraphs[i - 1], paragraphs[i]
+        if after.heading:
+            score = 100 if after.heading <= 2 or before.block else 80
+        elif before.heading:
+            continue  # Keep a heading with what it introduces
+        elif before.block or after.block:
+            score = 100
+        elif (
+            after.new_page
+            and not _SENTENCE_END.search(before.content.rstrip())
+            and after.content[:1].islower()
+        ):
+            continue  # Sentence continued on the next page
+        elif before.list and after.list or before.content.rstrip().endswith(":"):
+            score = 40
+        elif depths[i] > 0 and depths[i] >= drop:
+            score = 80
+        elif depths[i] == 0 and similarities[i] > high and not (before.list or after.list):
+            score = 60 if after.new_page else 40
+        else:
+            score = 60
+        breaks.append((spans[i][0], score))
+    return breaks
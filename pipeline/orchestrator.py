@@ -2,48 +2,75 @@
 Pipeline Orchestrator
 
 Coordinates the full document processing pipeline:
-1. Extraction (Gemini)
-2. Break scoring (GPT-4o)
+1. Extraction (text layer / cache / Gemini)
+2. Break scoring (GPT-4o, or local)
 3. Cleanup (deterministic)
 4. Chunking (DP)
-5. Image cropping (pdfplumber)
-6. Write to Airtable
-7. Summarization (GPT-4o)
+5. Image cropping (pdfium)
+6. Summarization (GPT-4o)
+7. Write chunks with summaries to the store (Airtable or SQLite)
 8. Update document status
 """
 
-from services import airtable, gcs
+from contextlib import ExitStack
+
+import config
+from services import chunk_blobs, events, metrics, purge, spool
+from services.store import store
 from pipeline import extract, breaks, cleanup, chunk, images, summarize
+from pipeline.document import PDFDocument
 
 
-def process_document(doc_record_id: str) -> None:
+def process_document(
+    doc_record_id: str,
+    document: PDFDocument | None = None,
+    break_scoring: str | None = None,
+) -> None:
     """
     Process a document through the full pipeline.
 
     Args:
-        doc_record_id: Airtable record ID of the document
+        doc_record_id: Record ID of the document
+        document: The PDF as parsed by the upload handler, if any (otherwise
+            it is opened from the spool). Closed when the pipeline finishes.
+        break_scoring: Break scoring mode for this document (see
+            breaks.MODES); default BREAK_SCORING_MODE
     """
+    with metrics.caller(f"doc:{doc_record_id}"), ExitStack() as resources:
+        if document is not None:
+            resources.callback(document.close)
+        _process_document(doc_record_id, document, break_scoring, resources)
+
+
+def _process_document(
+    doc_record_id: str,
+    document: PDFDocument | None,
+    break_scoring: str | None,
+    resources: ExitStack,
+) -> None:
+    """Run the pipeline steps, marking the document as errored on failure."""
     try:
         # Get document record
-        doc = airtable.get_document(doc_record_id)
+        doc = store.get_document(doc_record_id)
         if not doc:
             raise ValueError(f"Document not found: {doc_record_id}")
 
-        # Download PDF from GCS
-        pdf_url = doc["pdf_url"]
-        if not pdf_url:
-            raise ValueError("Document has no PDF URL")
+        if document is None:
+            # Open the PDF from the local spool (GCS after a restart or on
+            # another node)
+            pdf_url = doc["pdf_url"]
+            if not pdf_url:
+                raise ValueError("Document has no PDF URL")
 
-        # Extract filename from URL
-        # URL format: gs://bucket/pdfs/{doc_id}/{filename}
-        filename = pdf_url.split("/")[-1]
-        pdf_content = gcs.download_pdf(doc_record_id, filename)
+            document = resources.enter_context(
+                PDFDocument(spool.pdf_path(doc_record_id, pdf_url))
+            )
 
-        # Step 1: Extract text using Gemini
-        extracted_text = extract.extract_pdf(pdf_content)
+        # Step 1: Extract text (text layer, cache, Gemini)
+        extracted_text = extract.extract_pdf(document)
 
-        # Step 2: Score breaks using GPT-4o
-        text_with_breaks = breaks.score_breaks(extracted_text)
+        # Step 2: Score breaks (GPT-4o, or locally from document structure)
+        text_with_breaks = breaks.score_breaks(extracted_text, break_scoring)
 
         # Step 3: Cleanup (deterministic)
         cleaned_text, page_mapping = cleanup.cleanup(text_with_breaks)
@@ -56,73 +83,81 @@ def process_document(doc_record_id: str) -> None:
 
         # Step 5a: DISABLED - save_all_pages crashes pdfplumber on some PDFs
         # TODO: May remove entirely if PDF popup viewer is sufficient
-        # images.save_all_pages(doc_record_id, pdf_content)
+        # images.save_all_pages(doc_record_id, document)
 
         # Step 5b: Crop images for graphic chunks
-        image_urls = images.process_all_graphics(doc_record_id, pdf_content, chunks)
+        image_urls = images.process_all_graphics(doc_record_id, document, chunks)
+
+        # Step 6: Summarize chunks before writing, so each chunk is created
+        # once with its summary instead of patched afterwards
+        summaries = summarize.summarize_all(chunks)
 
-        # Step 6: Write chunks to Airtable
+        # Step 7: Write chunks to the store
         doc_name = doc["name"]
+        contents = [c.content_raw for c in chunks]
+        # Add NEW DOCUMENT marker to first chunk for multi-doc clarity
+        contents[0] = f"=== NEW DOCUMENT: {doc_name} ===\n\n{contents[0]}"
+
+        # Optionally pack chunk bodies into one blob; records then keep
+        # only each body's offset and length
+        spans = None
+        if config.CHUNK_BLOB_STORAGE:
+            spans = chunk_blobs.write(doc_record_id, contents)
+
         chunk_records = []
         for i, c in enumerate(chunks):
-            content = c.content_raw
-            # Add NEW DOCUMENT marker to first chunk for multi-doc clarity
-            if i == 0:
-                content = f"=== NEW DOCUMENT: {doc_name} ===\n\n{content}"
-
             record = {
                 "doc_id": [doc_record_id],  # Linked record field
                 "sequence_number": c.sequence_number,
                 "chunk_type": c.chunk_type,
-                "content_raw": content,
+                "content_summary": summaries.get(c.sequence_number),
                 "heading_path": c.heading_path,
                 "token_count": c.token_count,
                 "source_pages": c.source_pages,
             }
+            if spans:
+                record["content_offset"], record["content_length"] = spans[i]
+            else:
+                record["content_raw"] = contents[i]
+
             # Add image URL if this is a graphic chunk
             if c.sequence_number in image_urls:
                 record["image_url"] = image_urls[c.sequence_number]
 
             chunk_records.append(record)
 
-        created_chunks = airtable.create_chunks(chunk_records)
-
-        # Step 7: Summarize chunks
-        summaries = summarize.summarize_all(chunks)
+        store.create_chunks(chunk_records)
 
-        # Update chunks with summaries
-        # Map sequence_number to record_id
-        seq_to_record = {c["sequence_number"]: c["record_id"] for c in created_chunks}
-
-        for seq_num, summary in summaries.items():
-            if seq_num in seq_to_record:
-                record_id = seq_to_record[seq_num]
-                # Update chunk with summary
-                airtable._request(
-                    "PATCH",
-                    f"{airtable.config.AIRTABLE_CHUNKS_TABLE_ID}/{record_id}",
-                    json={"fields": {"content_summary": summary}},
-                )
+        # The document may have been deleted while it was processing; its
+        # purge could have run before these chunks were written
+        current = store.get_document(doc_record_id)
+        if current is None or current["status"] == purge.DELETING:
+            purge.purge_document(doc_record_id, delete_record=current is not None)
+            return
 
         # Step 8: Update document status
-        airtable.update_document(
+        updated = store.update_document(
             doc_record_id,
             {
                 "status": "ready",
                 "total_chunks": len(chunks),
             },
         )
+        events.publish(updated)
 
     except Exception as e:
-        # Mark document as error
+        # Mark document as error (unless it was deleted meanwhile)
         try:
-            airtable.update_document(
-                doc_record_id,
-                {
-                    "status": "error",
-                    "error_message": str(e)[:1000],  # Truncate long errors
-                },
-            )
+            current = store.get_document(doc_record_id)
+            if current and current["status"] != purge.DELETING:
+                updated = store.update_document(
+                    doc_record_id,
+                    {
+                        "status": "error",
+                        "error_message": str(e)[:1000],  # Truncate long errors
+                    },
+                )
+                events.publish(updated)
         except Exception:
             pass  # Best effort error recording
 
@@ -13,6 +13,7 @@ from pathlib import Path
 from openai import OpenAI
 
 import config
+from services import metrics
 from pipeline.chunk import Chunk
 
 # Initialize OpenAI client
@@ -60,29 +61,35 @@ def _summarize_text(text: str, prompt: str, max_retries: int = 5) -> str:
     """Generate summary for a text chunk using GPT-4o with retry logic."""
     import time
 
-    for attempt in range(max_retries):
-        try:
-            response = _client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": text},
-                ],
-                temperature=0.2,
-                max_tokens=500,
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            err_msg = str(e).lower()
-            is_rate_limit = any(
-                s in err_msg
-                for s in ["rate", "resource", "exhausted", "429", "quota", "limit"]
-            )
-            if is_rate_limit and attempt < max_retries - 1:
-                wait_time = (attempt + 1) * 10  # 10s, 20s, 30s, 40s
-                time.sleep(wait_time)
-            else:
-                raise
+    with metrics.track("openai", "summarize") as call:
+        for attempt in range(max_retries):
+            try:
+                response = _client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": prompt},
+                        {"role": "user", "content": text},
+                    ],
+                    temperature=0.2,
+                    max_tokens=500,
+                )
+                summary = response.choices[0].message.content.strip()
+                call.bytes_sent = metrics.text_size(prompt, text)
+                call.bytes_received = metrics.text_size(summary)
+                return summary
+            except Exception as e:
+                err_msg = str(e).lower()
+                is_rate_limit = any(
+                    s in err_msg
+                    for s in ["rate", "resource", "exhausted", "429", "quota", "limit"]
+                )
+                if is_rate_limit and attempt < max_retries - 1:
+                    wait_time = (attempt + 1) * 10  # 10s, 20s, 30s, 40s
+                    call.retries += 1
+                    time.sleep(wait_time)
+                    metrics.record_wait("openai", wait_time)
+                else:
+                    raise
 
 
 def summarize_chunk(chunk: Chunk) -> str:
@@ -123,11 +130,12 @@ def summarize_all(chunks: list[Chunk], max_workers: int = 3) -> dict[int, str]:
             summary = _summarize_text(chunk.content_raw, prompt)
             # Small delay between API calls to help with rate limiting
             time.sleep(0.5)
+            metrics.record_wait("openai", 0.5)
             return chunk.sequence_number, summary
 
     results = {}
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for seq_num, summary in executor.map(summarize_one, chunks):
+        for seq_num, summary in executor.map(metrics.propagate(summarize_one), chunks):
             results[seq_num] = summary
 
     return results
@@ -0,0 +1,302 @@
+"""
+Step 2a: Local extraction from the PDF text layer.
+
+Born-digital pages with a clean text layer and a simple layout don't need
+Gemini. Each page is classified with pdfplumber; pages that pass are
+extracted locally into the same format the extraction prompt produces
+(`[PAGE X]` marker, `#` markdown headings by font size, paragraphs, `- `
+and `1. ` list items, straight quotes, running headers/footers and page
+numbers dropped). Everything else (scanned pages, tables, figures, multi-column
+or rotated text, broken encodings or word spacing) is left for Gemini.
+"""
+
+import re
+import statistics
+from collections import Counter
+from dataclasses import dataclass, field
+
+from pipeline.document import PDFDocument
+
+# A page needs this much text to be considered born-digital
+MIN_TEXT_CHARS = 200
+# Images covering more than this fraction of the page need the LLM
+MAX_IMAGE_AREA = 0.02
+# More ruling lines/boxes than this usually means a table or diagram
+MAX_RULINGS = 8
+# More curve segments than this usually means a chart or drawing
+MAX_CURVES = 10
+# Fraction of text lines split by a gutter that marks a multi-column page
+MAX_SPLIT_LINES = 0.25
+# Fraction of unmapped or replacement glyphs that marks a broken text layer
+MAX_BAD_GLYPHS = 0.01
+# Fraction of non-upright characters that marks rotated text
+MAX_ROTATED_CHARS = 0.1
+# Fraction of words longer than LONG_WORD_CHARS that marks broken spacing
+# (words run together because the PDF has no space glyphs)
+MAX_LONG_WORDS = 0.03
+LONG_WORD_CHARS = 25
+
+# Word gap as a fraction of character size. pdfplumber's default absolute
+# tolerance (3pt) glues words together in PDFs without space glyphs (TeX,
+# DocBook); a relative one splits them correctly
+_X_TOLERANCE_RATIO = 0.15
+
+# Header/footer bands (fraction of page height)
+_MARGIN = 0.08
+# Font size ratio over body text that makes a short line a heading
+_HEADING_RATIO = 1.15
+_MAX_HEADING_CHARS = 120
+
+_CID = re.compile(r"\(cid:\d+\)")
+_PAGE_NUMBER = re.compile(r"(page\s*)?\d+(\s*(of|/)\s*\d+)?", re.IGNORECASE)
+_BULLET = re.compile(r"^[•◦▪▫●○■□‣⁃∙·\-–—*]\s*")
+_NUMBERED = re.compile(r"^(\d{1,3})[.)]\s+")
+_CHAR_MAP = str.maketrans({
+    "‘": "'", "’": "'", "‚": "'", "‛": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"',
+    " ": " ", " ": " ", " ": " ", " ": " ", "­": "",
+    "ﬀ": "ff", "ﬁ": "fi", "ﬂ": "fl", "ﬃ": "ffi", "ﬄ": "ffl",
+})
+
+
+@dataclass
+class _Line:
+    text: str
+    top: float
+    bottom: float
+    size: float
+
+
+@dataclass
+class PageAnalysis:
+    """Classification of one page."""
+
+    page_num: int  # 1-indexed
+    text_chars: int = 0
+    images: int = 0
+    image_area: float = 0.0  # Fraction of the page
+    rulings: int = 0
+    curves: int = 0
+    local: bool = False  # True if the text layer is good enough
+    reason: str = ""  # Why the page needs the LLM
+    lines: list[_Line] = field(default_factory=list, repr=False)
+    height: float = 0.0
+
+
+def _is_split_line(chars: list[dict], width: float) -> bool:
+    """True if a text line has a wide gap near the page middle (a gutter)."""
+    for prev, char in zip(chars, chars[1:]):
+        gap = char["x0"] - prev["x1"]
+        centre = (char["x0"] + prev["x1"]) / 2
+        if gap > 0.04 * width and 0.3 * width < centre < 0.7 * width:
+            return True
+    return False
+
+
+def _is_prose_word(word: str) -> bool:
+    """False for URLs, paths, identifiers and dot leaders, which may be long."""
+    word = word.strip("\"'()[]<>,;")
+    if "://" in word or "_" in word or word[:1] in ("/", "~"):
+        return False
+    return sum(c.isalpha() for c in word) > len(word) / 2
+
+
+def _classify(page, page_num: int, local: bool = True) -> PageAnalysis:
+    """
+    Measure a page and decide whether its text layer can be used.
+
+    With local=False only the measurements are taken (for batch sizing);
+    the page's lines aren't extracted or checked.
+    """
+    analysis = PageAnalysis(page_num=page_num, height=float(page.height))
+    page_area = float(page.width * page.height) or 1.0
+
+    chars = page.chars
+    text_chars = [c for c in chars if not c["text"].isspace()]
+    analysis.text_chars = len(text_chars)
+    analysis.images = len(page.images)
+    analysis.image_area = sum(
+        max(0.0, (img["x1"] - img["x0"]) * (img["bottom"] - img["top"])) for img in page.images
+    ) / page_area
+    analysis.rulings = len(page.lines) + len(page.rects)
+    analysis.curves = len(page.curves)
+    if not local:
+        return analysis
+
+    if analysis.text_chars < MIN_TEXT_CHARS:
+        analysis.reason = "little or no text layer"
+        return analysis
+    if analysis.image_area > MAX_IMAGE_AREA:
+        analysis.reason = "images"
+    elif analysis.rulings > MAX_RULINGS:
+        analysis.reason = "table or ruled layout"
+    elif analysis.curves > MAX_CURVES:
+        analysis.reason = "vector graphics"
+    else:
+        bad = sum(1 for c in text_chars if c["text"] == "�" or c["text"].startswith("(cid:"))
+        rotated = sum(1 for c in text_chars if not c.get("upright", True))
+        if bad / len(text_chars) > MAX_BAD_GLYPHS:
+            analysis.reason = "unmapped glyphs"
+        elif rotated / len(text_chars) > MAX_ROTATED_CHARS:
+            analysis.reason = "rotated text"
+    if analysis.reason:
+        return analysis
+
+    raw_lines = page.extract_text_lines(
+        strip=True, return_chars=True, x_tolerance_ratio=_X_TOLERANCE_RATIO
+    )
+    split = sum(1 for line in raw_lines if _is_split_line(line["chars"], float(page.width)))
+    if raw_lines and split / len(raw_lines) > MAX_SPLIT_LINES:
+        analysis.reason = "multi-column layout"
+        return analysis
+
+    lines = []
+    for line in raw_lines:
+        # Unmapped glyphs (below MAX_BAD_GLYPHS) are dropped, not emitted
+        text = " ".join(_CID.sub("", line["text"]).translate(_CHAR_MAP).split())
+        if text:
+            lines.append(
+                _Line(
+                    text=text,
+                    top=float(line["top"]),
+                    bottom=float(line["bottom"]),
+                    size=round(statistics.median(c["size"] for c in line["chars"]), 1),
+                )
+            )
+
+    # Words far longer than any real word mean the spacing wasn't recovered
+    words = [w for line in lines for w in line.text.split()]
+    long_words = sum(1 for w in words if len(w) > LONG_WORD_CHARS and _is_prose_word(w))
+    if words and long_words / len(words) > MAX_LONG_WORDS:
+        analysis.reason = "broken spacing"
+        return analysis
+
+    analysis.lines = lines
+    analysis.local = True
+    return analysis
+
+
+def _in_margin(line: _Line, height: float) -> bool:
+    return line.top < _MARGIN * height or line.bottom > (1 - _MARGIN) * height
+
+
+def _margin_key(text: str) -> str:
+    """Header/footer text with numbers masked, so 'Page 3' matches 'Page 4'."""
+    return re.sub(r"\d+", "#", text.lower())
+
+
+def _repeated_margin_lines(pages: list[PageAnalysis]) -> set[str]:
+    """Margin lines that repeat on many pages (running headers/footers)."""
+    counts = Counter()
+    for page in pages:
+        counts.update({_margin_key(l.text) for l in page.lines if _in_margin(l, page.height)})
+    threshold = max(3, len(pages) // 2)
+    return {key for key, count in counts.items() if count >= threshold}
+
+
+def _heading_levels(pages: list[PageAnalysis]) -> tuple[float, dict[float, int]]:
+    """Body font size and a heading level for each larger size (1 = largest)."""
+    weights = Counter()
+    for page in pages:
+        for line in page.lines:
+            weights[line.size] += len(line.text)
+    if not weights:
+        return 0.0, {}
+    body = weights.most_common(1)[0][0]
+    larger = sorted(
+        {line.size for page in pages for line in page.lines if line.size >= body * _HEADING_RATIO},
+        reverse=True,
+    )
+    return body, {size: min(i + 1, 3) for i, size in enumerate(larger)}
+
+
+def _is_list_item(block: str) -> bool:
+    return block.startswith("- ") or _NUMBERED.match(block) is not None
+
+
+def _render(page: PageAnalysis, levels: dict[float, int], repeated: set[str]) -> str:
+    """Format a page like the extraction prompt's output."""
+    blocks: list[str] = []
+    paragraph: list[str] = []
+    heights = [l.bottom - l.top for l in page.lines]
+    line_height = statistics.median(heights) if heights else 0.0
+    prev: _Line | None = None
+
+    def flush():
+        if paragraph:
+            blocks.append(" ".join(paragraph))
+            paragraph.clear()
+
+    for line in page.lines:
+        if _in_margin(line, page.height) and (
+            _PAGE_NUMBER.fullmatch(line.text) or _margin_key(line.text) in repeated
+        ):
+            continue
+
+        level = levels.get(line.size)
+        if level and len(line.text) <= _MAX_HEADING_CHARS:
+            flush()
+            # Consecutive lines of one heading are merged
+            if prev is not None and blocks and levels.get(prev.size) == level and blocks[-1].startswith("#"):
+                blocks[-1] += f" {line.text}"
+            else:
+                blocks.append(f"{'#' * level} {line.text}")
+            prev = line
+            continue
+
+        bullet = _BULLET.match(line.text)
+        numbered = _NUMBERED.match(line.text)
+        gap = line.top - prev.bottom if prev is not None else 0.0
+        if bullet or numbered or (prev is not None and gap > 0.8 * line_height):
+            flush()
+        if bullet:
+            text = _BULLET.sub("- ", line.text, count=1)
+        elif numbered:
+            text = _NUMBERED.sub(rf"\g<1>. ", line.text, count=1)
+        else:
+            text = line.text
+        if paragraph and paragraph[-1].endswith("-") and text[:1].islower():
+            # Re-join a word hyphenated across lines
+            paragraph[-1] = paragraph[-1][:-1] + text
+        else:
+            paragraph.append(text)
+        prev = line
+    flush()
+
+    # Blank lines between blocks, except within a run of list items
+    body = ""
+    for i, block in enumerate(blocks):
+        if i:
+            body += "\n" if _is_list_item(block) and _is_list_item(blocks[i - 1]) else "\n\n"
+        body += block
+    return f"[PAGE {page.page_num}]\n{body}"
+
+
+def analyze(document: PDFDocument, local: bool = True) -> list[PageAnalysis]:
+    """
+    Classify every page (in order), keeping the text lines of local pages.
+
+    With local=False pages are only measured, and none is marked local.
+    """
+    analyses = []
+    with document.lock:
+        for page_num, page in enumerate(document.plumber.pages, 1):
+            analyses.append(_classify(page, page_num, local))
+            page.close()  # Free the page's parsed objects
+    return analyses
+
+
+def extract_local_pages(analyses: list[PageAnalysis]) -> dict[int, str]:
+    """
+    Extract the pages that analyze() marked local.
+
+    Returns:
+        {page_num: extracted text} for local pages
+    """
+    local = [a for a in analyses if a.local]
+    repeated = _repeated_margin_lines(local)
+    _, levels = _heading_levels(local)
+    texts = {page.page_num: _render(page, levels, repeated) for page in local}
+    for page in local:
+        page.lines = []  # Only needed for rendering
+    return texts
@@ -10,6 +10,7 @@ from openai import OpenAI
 import google.generativeai as genai
 
 import config
+from services import metrics
 
 _openai_client = OpenAI(api_key=config.OPENAI_API_KEY)
 genai.configure(api_key=config.GEMINI_API_KEY)
@@ -79,16 +80,20 @@ def generate_answer(
 
 def _answer_with_openai(prompt: str, question: str, model: str) -> str:
     """Generate answer using OpenAI model."""
-    response = _openai_client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": question},
-        ],
-        temperature=0.3,
-        max_tokens=2000,
-    )
-    return response.choices[0].message.content
+    with metrics.track("openai", "answer") as call:
+        response = _openai_client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": question},
+            ],
+            temperature=0.3,
+            max_tokens=2000,
+        )
+        answer = response.choices[0].message.content
+        call.bytes_sent = metrics.text_size(prompt, question)
+        call.bytes_received = metrics.text_size(answer)
+    return answer
 
 
 def _answer_with_gemini(prompt: str, question: str) -> str:
@@ -96,11 +101,15 @@ def _answer_with_gemini(prompt: str, question: str) -> str:
     model = genai.GenerativeModel("gemini-2.0-flash")
     full_prompt = f"{prompt}\n\nQuestion: {question}"
 
-    response = model.generate_content(
-        full_prompt,
-        generation_config=genai.GenerationConfig(
-            temperature=0.3,
-            max_output_tokens=2000,
-        ),
-    )
-    return response.text
+    with metrics.track("gemini", "answer") as call:
+        response = model.generate_content(
+            full_prompt,
+            generation_config=genai.GenerationConfig(
+                temperature=0.3,
+                max_output_tokens=2000,
+            ),
+        )
+        answer = response.text
+        call.bytes_sent = metrics.text_size(full_prompt)
+        call.bytes_received = metrics.text_size(answer)
+    return answer
@@ -4,7 +4,7 @@ Context Assembler - Step Q3
 Builds the context window using variable-resolution retrieval.
 """
 
-from services import airtable
+from services.store import store
 
 
 def assemble_context(
@@ -94,12 +94,12 @@ def load_all_chunks_with_content(selected_ids: set[str]) -> list[dict]:
     """
     # For MVP, just load all chunks with all fields
     # In production, you'd want to optimize this query
-    docs = airtable.list_documents()
+    docs = store.list_documents()
     ready_docs = [d for d in docs if d.get("status") == "ready"]
 
     all_chunks = []
     for doc in ready_docs:
-        chunks = airtable.get_chunks_by_document(doc["record_id"])
+        chunks = store.get_chunks_by_document(doc["record_id"])
         all_chunks.extend(chunks)
 
     return all_chunks
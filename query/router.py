@@ -11,6 +11,7 @@ from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 
 import config
+from services import metrics
 
 _client = OpenAI(api_key=config.OPENAI_API_KEY)
 
@@ -76,17 +77,19 @@ def _route_batch(
     prompt = prompt.replace("{question}", question)
     prompt = prompt.replace("{all_summaries_formatted}", summaries_formatted)
 
-    response = _client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": question},
-        ],
-        temperature=0.1,
-        max_tokens=1000,
-    )
-
-    result_text = response.choices[0].message.content.strip()
+    with metrics.track("openai", "route") as call:
+        response = _client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": question},
+            ],
+            temperature=0.1,
+            max_tokens=1000,
+        )
+        result_text = response.choices[0].message.content.strip()
+        call.bytes_sent = metrics.text_size(prompt, question)
+        call.bytes_received = metrics.text_size(result_text)
 
     # Parse JSON array from response
     try:
@@ -143,7 +146,7 @@ def route_question(
     all_ids = set()
     with ThreadPoolExecutor(max_workers=len(batches)) as executor:
         futures = [
-            executor.submit(_route_batch, question, history, batch, prompt)
+            executor.submit(metrics.propagate(_route_batch), question, history, batch, prompt)
             for batch in batches
         ]
         for future in futures:
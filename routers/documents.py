@@ -1,71 +1,170 @@
+import asyncio
+import hashlib
+import json
+import time
 from datetime import date
-from fastapi import APIRouter, File, UploadFile, HTTPException, BackgroundTasks
-
-from services import airtable, gcs
+from pathlib import Path
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException, BackgroundTasks, Header, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import config
+from services import chunk_blobs, events, gcs, purge, spool
+from services.store import store
+from pipeline import breaks
+from pipeline.document import PDFDocument
 from pipeline.orchestrator import process_document
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
+# Seconds between SSE keep-alive comments
+_KEEPALIVE_INTERVAL = 15.0
+
+# Last document list served: reused while the document-set version is
+# unchanged, so unchanged polls don't hit the store
+_list_cache = {"version": None, "fetched_at": 0.0, "etag": None, "body": None}
+
 
 @router.post("/upload")
-async def upload_document(file: UploadFile = File(...), background_tasks: BackgroundTasks = None):
-    """Upload a PDF document for processing."""
+async def upload_document(
+    file: UploadFile = File(...),
+    break_scoring: str | None = Form(None),
+    background_tasks: BackgroundTasks = None,
+):
+    """
+    Upload a PDF document for processing.
+
+    `break_scoring` optionally overrides BREAK_SCORING_MODE for this
+    document, e.g. "local" to skip GPT-4o for bulk backfills.
+    """
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    if break_scoring is not None and break_scoring not in breaks.MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"break_scoring must be one of: {', '.join(breaks.MODES)}",
+        )
+
+    # Copy the upload to a staging file in the spool in 1MB pieces, off the
+    # event loop, so memory stays flat whatever the file size
+    staged = await asyncio.to_thread(spool.stage, file.file)
+    try:
+        if staged.stat().st_size == 0:
+            raise HTTPException(status_code=400, detail="Empty file")
+
+        try:
+            document = await asyncio.to_thread(_open_pdf, staged)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid PDF file")
+
+        try:
+            doc = await asyncio.to_thread(
+                _store_upload, file.filename, document.page_count, staged
+            )
+        except BaseException:
+            document.close()
+            raise
+    except BaseException:
+        spool.abandon(staged)
+        raise
 
-    content = await file.read()
-    if len(content) == 0:
-        raise HTTPException(status_code=400, detail="Empty file")
+    events.publish(doc)
+
+    # Start async processing pipeline on the already parsed PDF (the
+    # pipeline closes it when done)
+    background_tasks.add_task(process_document, doc["record_id"], document, break_scoring)
+
+    return {
+        "doc_id": doc["record_id"],
+        "name": doc["name"],
+        "status": doc["status"],
+    }
 
-    # Count pages using pypdf
-    from io import BytesIO
-    from pypdf import PdfReader
 
+def _open_pdf(path: Path) -> PDFDocument:
+    """Open the staged PDF and count its pages (reads the page tree only)."""
+    document = PDFDocument(path)
     try:
-        reader = PdfReader(BytesIO(content))
-        total_pages = len(reader.pages)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid PDF file")
+        document.page_count
+    except BaseException:
+        document.close()
+        raise
+    return document
+
 
+def _store_upload(filename: str, total_pages: int, staged: Path) -> dict:
+    """Create the document record, upload the staged PDF and spool it."""
     # Create document record first to get record_id
-    doc = airtable.create_document({
-        "name": file.filename,
+    doc = store.create_document({
+        "name": filename,
         "status": "uploading",
         "total_pages": total_pages,
         "upload_date": date.today().isoformat(),
     })
 
-    # Upload PDF to GCS using record_id as doc_id
-    pdf_url = gcs.upload_pdf(doc["record_id"], file.filename, content)
+    # Upload PDF to GCS using record_id as doc_id, then keep the staged
+    # copy in the spool so the pipeline doesn't download it straight back
+    pdf_url = gcs.upload_pdf(doc["record_id"], filename, staged)
+    spool.commit(doc["record_id"], staged)
 
     # Update document with PDF URL
-    doc = airtable.update_document(doc["record_id"], {"pdf_url": pdf_url})
-
-    # Start async processing pipeline
-    background_tasks.add_task(process_document, doc["record_id"])
-
-    return {
-        "doc_id": doc["record_id"],
-        "name": doc["name"],
-        "status": doc["status"],
-    }
+    return store.update_document(doc["record_id"], {"pdf_url": pdf_url})
 
 
 @router.get("")
-async def list_documents():
-    """List all documents."""
-    docs = airtable.list_documents()
-    return [
-        {
-            "doc_id": d["record_id"],
-            "name": d["name"],
-            "status": d["status"],
-            "total_chunks": d["total_chunks"],
-            "total_pages": d["total_pages"],
-            "upload_date": d["upload_date"],
-        }
-        for d in docs
-    ]
+async def list_documents(if_none_match: str | None = Header(None)):
+    """List all documents. Supports ETag / If-None-Match revalidation."""
+    version = events.version()
+    age = time.monotonic() - _list_cache["fetched_at"]
+
+    # Changes made by other worker processes don't bump this process's
+    # version, so the cached list is also refreshed after a max age
+    if _list_cache["version"] != version or age > config.DOCUMENT_LIST_MAX_AGE:
+        docs = await store.alist_documents(projection="listing")
+        body = [
+            {
+                "doc_id": d["record_id"],
+                "name": d["name"],
+                "status": d["status"],
+                "total_chunks": d["total_chunks"],
+                "total_pages": d["total_pages"],
+                "upload_date": d["upload_date"],
+            }
+            for d in docs
+            if d["status"] != purge.DELETING
+        ]
+        digest = hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest()
+        _list_cache.update(
+            version=version,
+            fetched_at=time.monotonic(),
+            etag=f'"{digest}"',
+            body=body,
+        )
+
+    headers = {"ETag": _list_cache["etag"], "Cache-Control": "no-cache"}
+    if if_none_match and _list_cache["etag"] in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(_list_cache["body"], headers=headers)
+
+
+@router.get("/events")
+async def document_events(request: Request):
+    """Stream document status changes as server-sent events."""
+
+    async def stream():
+        async with events.subscribe() as queue:
+            yield f"event: version\ndata: {json.dumps({'version': events.version()})}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: status\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.patch("/{doc_id}")
@@ -74,30 +173,28 @@ async def rename_document(doc_id: str, body: dict):
     if "name" not in body:
         raise HTTPException(status_code=400, detail="Missing 'name' field")
 
-    doc = airtable.get_document(doc_id)
-    if not doc:
+    doc = store.get_document(doc_id)
+    if not doc or doc["status"] == purge.DELETING:
         raise HTTPException(status_code=404, detail="Document not found")
 
     old_name = doc["name"]
     new_name = body["name"]
 
     # Update document record
-    updated = airtable.update_document(doc_id, {"name": new_name})
+    updated = store.update_document(doc_id, {"name": new_name})
+    events.publish(updated)
 
     # Update NEW DOCUMENT marker in first chunk if it exists
-    chunks = airtable.get_chunks_by_document(doc_id)
+    chunks = store.get_chunks_by_document(doc_id, projection="assembly")
     if chunks:
         first_chunk = min(chunks, key=lambda c: c["sequence_number"])
-        content = first_chunk.get("content_raw", "")
+        chunk_blobs.hydrate([first_chunk])
+        content = first_chunk.get("content_raw") or ""
         old_marker = f"=== NEW DOCUMENT: {old_name} ==="
         new_marker = f"=== NEW DOCUMENT: {new_name} ==="
         if old_marker in content:
             new_content = content.replace(old_marker, new_marker, 1)
-            airtable._request(
-                "PATCH",
-                f"{airtable.config.AIRTABLE_CHUNKS_TABLE_ID}/{first_chunk['record_id']}",
-                json={"fields": {"content_raw": new_content}},
-            )
+            store.update_chunks({first_chunk["record_id"]: {"content_raw": new_content}})
 
     return {
         "doc_id": updated["record_id"],
@@ -107,20 +204,19 @@ async def rename_document(doc_id: str, body: dict):
 
 
 @router.delete("/{doc_id}")
-async def delete_document(doc_id: str):
-    """Delete a document and all associated data."""
-    doc = airtable.get_document(doc_id)
-    if not doc:
+async def delete_document(doc_id: str, background_tasks: BackgroundTasks):
+    """Delete a document: tombstone it now, purge its data in the background."""
+    doc = store.get_document(doc_id)
+    if not doc or doc["status"] == purge.DELETING:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    # Delete chunks from Airtable
-    airtable.delete_chunks_by_document(doc_id)
+    # The tombstone hides the document from listings and queries at once
+    store.update_document(doc_id, {"status": purge.DELETING})
+    gcs.forget_urls(doc_id)
+    events.publish(doc, deleted=True)
 
-    # Delete files from GCS
-    gcs.delete_document_files(doc_id)
-
-    # Delete document record
-    airtable.delete_document(doc_id)
+    # Chunks, GCS files and the record itself are removed after responding
+    background_tasks.add_task(purge.purge_document, doc_id)
 
     return {"success": True}
 
@@ -128,11 +224,13 @@ async def delete_document(doc_id: str):
 @router.get("/{doc_id}/pdf")
 async def get_pdf(doc_id: str):
     """Get a signed URL for the document PDF."""
-    doc = airtable.get_document(doc_id)
-    if not doc:
+    # Name and page count always come from the store (other workers may have
+    # renamed or deleted the document); only the signed URL is cached
+    doc = store.get_document(doc_id)
+    if not doc or doc["status"] == purge.DELETING:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    url = gcs.get_pdf_url(doc_id)
+    url = gcs.get_pdf_url(doc_id, doc["pdf_url"])
     if not url:
         raise HTTPException(status_code=404, detail="PDF not found")
 
@@ -142,12 +240,13 @@ async def get_pdf(doc_id: str):
 @router.get("/{doc_id}/page/{page_num}/image")
 async def get_page_image(doc_id: str, page_num: int):
     """Get a signed URL for a page image preview."""
-    doc = airtable.get_document(doc_id)
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
-
+    # The (cached) image lookup comes first: the document record is only
+    # needed to tell a missing document from a missing image
     url = gcs.get_page_image_url(doc_id, page_num)
     if not url:
+        doc = store.get_document(doc_id)
+        if not doc or doc["status"] == purge.DELETING:
+            raise HTTPException(status_code=404, detail="Document not found")
         raise HTTPException(status_code=404, detail="Page image not found")
 
     return {"url": url}
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from services.local_objects import LocalObjectStore
+from services.object_store import objects
+
+router = APIRouter(prefix="/api/objects", tags=["objects"])
+
+
+@router.get("/{key:path}")
+def get_object(key: str, expires: int, signature: str):
+    """Serve an object from the local store via a signed URL (local backend only)."""
+    if not isinstance(objects, LocalObjectStore):
+        raise HTTPException(status_code=404, detail="Not found")
+    try:
+        path = objects.open_signed(key, expires, signature)
+    except ValueError:
+        path = None
+    if path is None:
+        raise HTTPException(status_code=403, detail="Invalid or expired signature")
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Object not found")
+
+    return FileResponse(path)
@@ -1,58 +1,16 @@
+import asyncio
+import secrets
+
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import httpx
 
-from services import airtable
+from services import chunk_blobs, metrics
+from services.store import store
 from query import router as query_router, assembler, answerer
-import config
 
 router = APIRouter(prefix="/api", tags=["query"])
 
 
-def _load_all_chunks() -> list[dict]:
-    """Load all chunks directly from Airtable (workaround for linked record filter issues)."""
-    records = []
-    offset = None
-    url = f"https://api.airtable.com/v0/{config.AIRTABLE_BASE_ID}/{config.AIRTABLE_CHUNKS_TABLE_ID}"
-    headers = {
-        "Authorization": f"Bearer {config.AIRTABLE_API_KEY}",
-        "Content-Type": "application/json",
-    }
-
-    while True:
-        params = {
-            "sort[0][field]": "sequence_number",
-            "sort[0][direction]": "asc",
-        }
-        if offset:
-            params["offset"] = offset
-
-        response = httpx.get(url, headers=headers, params=params, timeout=30.0)
-        response.raise_for_status()
-        data = response.json()
-
-        for r in data.get("records", []):
-            fields = r.get("fields", {})
-            records.append({
-                "record_id": r["id"],
-                "doc_id": fields.get("doc_id", []),
-                "sequence_number": fields.get("sequence_number"),
-                "chunk_type": fields.get("chunk_type"),
-                "content_raw": fields.get("content_raw"),
-                "content_summary": fields.get("content_summary"),
-                "image_url": fields.get("image_url"),
-                "heading_path": fields.get("heading_path"),
-                "token_count": fields.get("token_count"),
-                "source_pages": fields.get("source_pages"),
-            })
-
-        offset = data.get("offset")
-        if not offset:
-            break
-
-    return records
-
-
 class QueryRequest(BaseModel):
     question: str
     conversation_history: list[dict] = []
@@ -79,8 +37,14 @@ async def query(request: QueryRequest):
     if request.model not in ["gpt-4o", "gpt-4o-mini", "gemini-3"]:
         raise HTTPException(status_code=400, detail=f"Unsupported model: {request.model}")
 
+    with metrics.caller(f"query:{secrets.token_hex(4)}"):
+        return await _answer(request)
+
+
+async def _answer(request: QueryRequest) -> QueryResponse:
+    """Run the query steps Q1-Q4."""
     # Step Q1: Load all chunks from ready documents
-    docs = airtable.list_documents()
+    docs = await store.alist_documents(projection="listing")
     ready_docs = {d["record_id"]: d["name"] for d in docs if d.get("status") == "ready"}
 
     if not ready_docs:
@@ -89,8 +53,13 @@ async def query(request: QueryRequest):
             sources=[],
         )
 
-    # Load all chunks directly (workaround for linked record filter issues)
-    all_chunks = _load_all_chunks()
+    # Load summaries and metadata only; raw content is fetched after routing.
+    # Chunks of documents still processing or being deleted are left out.
+    all_chunks = [
+        c
+        for c in await store.alist_chunks(projection="routing")
+        if c["doc_id"] and c["doc_id"][0] in ready_docs
+    ]
 
     if not all_chunks:
         return QueryResponse(
@@ -105,6 +74,16 @@ async def query(request: QueryRequest):
         all_chunks,
     )
 
+    # Fetch full content for the selected chunks only
+    known_ids = {c["record_id"] for c in all_chunks}
+    selected_ids = [cid for cid in selected_ids if cid in known_ids]
+    selected = await store.aget_chunks_by_ids(selected_ids, projection="assembly")
+    await asyncio.to_thread(chunk_blobs.hydrate, selected)
+    content_by_id = {c["record_id"]: c["content_raw"] for c in selected}
+    for chunk in all_chunks:
+        if chunk["record_id"] in content_by_id:
+            chunk["content_raw"] = content_by_id[chunk["record_id"]]
+
     # Step Q3: Assemble context
     context, sources = assembler.assemble_context(
         all_chunks,
@@ -1,8 +1,20 @@
+import asyncio
+import random
+import threading
 import time
-from typing import Any
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Iterator
 import httpx
 
 import config
+from services import metrics
+from services.ratelimit import TokenBucket
+from services.schema import (
+    CHUNK_PROJECTIONS,
+    DOCUMENT_PROJECTIONS,
+    format_chunk,
+    format_document,
+)
 
 BASE_URL = f"https://api.airtable.com/v0/{config.AIRTABLE_BASE_ID}"
 HEADERS = {
@@ -10,50 +22,222 @@ HEADERS = {
     "Content-Type": "application/json",
 }
 
-# Rate limiter: 5 requests/second
-_last_request_time = 0.0
-_MIN_INTERVAL = 0.2  # 1/5 second
+# Shared pooled clients: keep-alive + HTTP/2, so paging through a table
+# reuses one TLS connection instead of handshaking on every request
+_LIMITS = httpx.Limits(
+    max_connections=config.AIRTABLE_MAX_CONNECTIONS,
+    max_keepalive_connections=config.AIRTABLE_MAX_KEEPALIVE,
+    keepalive_expiry=config.AIRTABLE_KEEPALIVE_EXPIRY,
+)
+_client: httpx.Client | None = None
+_async_client: httpx.AsyncClient | None = None
+_client_lock = threading.Lock()
+
+# Rate limiter: 5 requests/second per base, optionally shared across workers
+_bucket = TokenBucket(
+    rate=config.AIRTABLE_RATE_LIMIT,
+    capacity=config.AIRTABLE_RATE_LIMIT_BURST,
+    state_path=config.AIRTABLE_RATE_LIMIT_STATE,
+    name=config.AIRTABLE_BASE_ID,
+)
+_MAX_RETRIES = config.AIRTABLE_MAX_RETRIES
+_MAX_BACKOFF = 30.0  # Airtable asks clients to wait 30s after a 429
+
+
+def _client_options() -> dict[str, Any]:
+    """Options shared by the sync and async clients."""
+    return {
+        "base_url": BASE_URL,
+        "headers": HEADERS,
+        "timeout": 30.0,
+        "http2": config.AIRTABLE_HTTP2,
+        "limits": _LIMITS,
+    }
 
 
-def _rate_limit():
-    """Enforce rate limit before each request."""
-    global _last_request_time
-    elapsed = time.time() - _last_request_time
-    if elapsed < _MIN_INTERVAL:
-        time.sleep(_MIN_INTERVAL - elapsed)
-    _last_request_time = time.time()
+def get_client() -> httpx.Client:
+    """Get the shared sync client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(**_client_options())
+    return _client
 
 
-def _request(method: str, endpoint: str, **kwargs) -> dict:
-    """Make rate-limited request to Airtable API."""
-    _rate_limit()
-    url = f"{BASE_URL}/{endpoint}"
-    response = httpx.request(method, url, headers=HEADERS, timeout=30.0, **kwargs)
-    response.raise_for_status()
-    return response.json() if response.content else {}
+def get_async_client() -> httpx.AsyncClient:
+    """Get the shared async client, creating it on first use."""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(**_client_options())
+    return _async_client
 
 
-# --- Documents ---
+def close() -> None:
+    """Close the shared sync client (called on app shutdown)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def aclose() -> None:
+    """Close the shared async client (called on app shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def _retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying a 429, from Retry-After or backoff."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return min(_MAX_BACKOFF, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after).timestamp()
+                return min(_MAX_BACKOFF, max(0.0, retry_at - time.time()))
+            except (TypeError, ValueError):
+                pass
+    return min(_MAX_BACKOFF, 2.0 ** attempt)
+
 
+def _jitter(delay: float) -> float:
+    """Random extra wait so retrying callers don't stampede together."""
+    return random.uniform(0, 0.25 * delay + 0.1)
 
-def list_documents() -> list[dict]:
-    """List all documents, ordered by upload_date descending."""
-    records = []
+
+def _operation(method: str, endpoint: str) -> str:
+    """Metrics label for a request, e.g. "GET chunks"."""
+    if endpoint.startswith(config.AIRTABLE_DOCUMENTS_TABLE_ID):
+        return f"{method} documents"
+    return f"{method} chunks"
+
+
+def _request(method: str, endpoint: str, **kwargs) -> dict:
+    """Make rate-limited request to Airtable API, retrying 429s."""
+    with metrics.track("airtable", _operation(method, endpoint)) as call:
+        for attempt in range(_MAX_RETRIES + 1):
+            metrics.record_wait("airtable", _bucket.acquire())
+            response = get_client().request(method, endpoint, **kwargs)
+            call.bytes_sent += len(response.request.content)
+            call.bytes_received += len(response.content)
+            if response.status_code == 429 and attempt < _MAX_RETRIES:
+                delay = _retry_delay(response, attempt)
+                _bucket.penalize(delay)
+                call.retries += 1
+                time.sleep(_jitter(delay))
+                continue
+            response.raise_for_status()
+            return response.json() if response.content else {}
+
+
+async def _arequest(method: str, endpoint: str, **kwargs) -> dict:
+    """Async version of _request."""
+    with metrics.track("airtable", _operation(method, endpoint)) as call:
+        for attempt in range(_MAX_RETRIES + 1):
+            metrics.record_wait("airtable", await _bucket.aacquire())
+            response = await get_async_client().request(method, endpoint, **kwargs)
+            call.bytes_sent += len(response.request.content)
+            call.bytes_received += len(response.content)
+            if response.status_code == 429 and attempt < _MAX_RETRIES:
+                delay = _retry_delay(response, attempt)
+                await _bucket.apenalize(delay)
+                call.retries += 1
+                await asyncio.sleep(_jitter(delay))
+                continue
+            response.raise_for_status()
+            return response.json() if response.content else {}
+
+
+def _paginate(table_id: str, params: dict) -> Iterator[dict]:
+    """Yield every record of a list request, following offsets."""
     offset = None
+    while True:
+        page_params = dict(params)
+        if offset:
+            page_params["offset"] = offset
 
+        data = _request("GET", table_id, params=page_params)
+        yield from data.get("records", [])
+
+        offset = data.get("offset")
+        if not offset:
+            break
+
+
+async def _apaginate(table_id: str, params: dict) -> AsyncIterator[dict]:
+    """Async version of _paginate."""
+    offset = None
     while True:
-        params = {"sort[0][field]": "upload_date", "sort[0][direction]": "desc"}
+        page_params = dict(params)
         if offset:
-            params["offset"] = offset
+            page_params["offset"] = offset
 
-        data = _request("GET", config.AIRTABLE_DOCUMENTS_TABLE_ID, params=params)
-        records.extend(data.get("records", []))
+        data = await _arequest("GET", table_id, params=page_params)
+        for record in data.get("records", []):
+            yield record
 
         offset = data.get("offset")
         if not offset:
             break
 
-    return [_format_document(r) for r in records]
+
+# --- Documents ---
+
+
+_DOCUMENT_SORT = {"sort[0][field]": "upload_date", "sort[0][direction]": "desc"}
+_CHUNK_SORT = {"sort[0][field]": "sequence_number", "sort[0][direction]": "asc"}
+
+def _projection_params(projections: dict, projection: str | None) -> dict:
+    """fields[] query params for a named projection."""
+    if projection is None:
+        return {}
+    return {"fields[]": projections[projection]}
+
+
+def _formula_string(value: str) -> str:
+    """Quote a value for use inside an Airtable formula."""
+    escaped = value.replace("\\", "\\\\").replace("'", "\\'")
+    return f"'{escaped}'"
+
+
+def _modified_since_params(modified_since: str | None) -> dict:
+    """filterByFormula selecting records changed after an ISO-8601 timestamp."""
+    if modified_since is None:
+        return {}
+    return {
+        "filterByFormula": (
+            f"IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE({_formula_string(modified_since)}))"
+        )
+    }
+
+
+def list_documents(
+    projection: str | None = None, modified_since: str | None = None
+) -> list[dict]:
+    """List documents, ordered by upload_date descending (optionally only recent changes)."""
+    params = {
+        **_DOCUMENT_SORT,
+        **_projection_params(DOCUMENT_PROJECTIONS, projection),
+        **_modified_since_params(modified_since),
+    }
+    records = _paginate(config.AIRTABLE_DOCUMENTS_TABLE_ID, params)
+    fields = DOCUMENT_PROJECTIONS.get(projection)
+    return [_format_document(r, fields) for r in records]
+
+
+async def alist_documents(projection: str | None = None) -> list[dict]:
+    """Async version of list_documents."""
+    params = {**_DOCUMENT_SORT, **_projection_params(DOCUMENT_PROJECTIONS, projection)}
+    fields = DOCUMENT_PROJECTIONS.get(projection)
+    return [
+        _format_document(r, fields)
+        async for r in _apaginate(config.AIRTABLE_DOCUMENTS_TABLE_ID, params)
+    ]
 
 
 def get_document(record_id: str) -> dict | None:
@@ -92,51 +276,87 @@ def delete_document(record_id: str) -> None:
     _request("DELETE", f"{config.AIRTABLE_DOCUMENTS_TABLE_ID}/{record_id}")
 
 
-def _format_document(record: dict) -> dict:
-    """Convert Airtable record to API response format."""
-    fields = record.get("fields", {})
-    return {
-        "record_id": record["id"],
-        "doc_id": fields.get("doc_id"),  # Auto-number from Airtable
-        "name": fields.get("name"),
-        "status": fields.get("status"),
-        "pdf_url": fields.get("pdf_url"),
-        "total_chunks": fields.get("total_chunks"),
-        "total_pages": fields.get("total_pages"),
-        "upload_date": fields.get("upload_date"),
-        "error_message": fields.get("error_message"),
-    }
+def _format_document(record: dict, fields: list[str] | None = None) -> dict:
+    """Convert Airtable record to API response format (only `fields` if given)."""
+    return format_document(record["id"], record.get("fields", {}), fields)
 
 
 # --- Chunks ---
 
 
-def get_chunks_by_document(doc_record_id: str) -> list[dict]:
-    """Get all chunks for a document, ordered by sequence_number."""
-    records = []
-    offset = None
+def list_chunks(projection: str | None = None, modified_since: str | None = None) -> list[dict]:
+    """List chunks across documents, ordered by sequence_number (optionally only recent changes)."""
+    params = {
+        **_CHUNK_SORT,
+        **_projection_params(CHUNK_PROJECTIONS, projection),
+        **_modified_since_params(modified_since),
+    }
+    records = _paginate(config.AIRTABLE_CHUNKS_TABLE_ID, params)
+    fields = CHUNK_PROJECTIONS.get(projection)
+    return [_format_chunk(r, fields) for r in records]
 
-    # Fetch all chunks and filter by doc_id in Python
-    # (Airtable linked record formulas are complex)
-    while True:
-        params = {
-            "sort[0][field]": "sequence_number",
-            "sort[0][direction]": "asc",
-        }
-        if offset:
-            params["offset"] = offset
 
-        data = _request("GET", config.AIRTABLE_CHUNKS_TABLE_ID, params=params)
-        for r in data.get("records", []):
-            # doc_id is a linked record array like ['recXXX']
-            if doc_record_id in r.get("fields", {}).get("doc_id", []):
-                records.append(r)
+async def alist_chunks(projection: str | None = None) -> list[dict]:
+    """Async version of list_chunks."""
+    params = {**_CHUNK_SORT, **_projection_params(CHUNK_PROJECTIONS, projection)}
+    fields = CHUNK_PROJECTIONS.get(projection)
+    return [
+        _format_chunk(r, fields)
+        async for r in _apaginate(config.AIRTABLE_CHUNKS_TABLE_ID, params)
+    ]
 
-        offset = data.get("offset")
-        if not offset:
-            break
 
-    return [_format_chunk(r) for r in records]
+def get_chunks_by_document(doc_record_id: str, projection: str | None = None) -> list[dict]:
+    """Get all chunks for a document, ordered by sequence_number."""
+    # Filter server-side on the plain-text doc_record_id field; formulas
+    # over the linked doc_id field only see primary field values, not IDs
+    params = {
+        **_CHUNK_SORT,
+        **_projection_params(CHUNK_PROJECTIONS, projection),
+        "filterByFormula": f"{{doc_record_id}}={_formula_string(doc_record_id)}",
+    }
+    records = _paginate(config.AIRTABLE_CHUNKS_TABLE_ID, params)
+    fields = CHUNK_PROJECTIONS.get(projection)
+    return [_format_chunk(r, fields) for r in records]
+
+
+# Record IDs per filterByFormula lookup (keeps the URL well under limits)
+_IDS_PER_LOOKUP = 50
+
+
+def _record_id_batches(record_ids: list[str], projection: str | None) -> list[dict]:
+    """List-request params selecting `record_ids`, one dict per batch."""
+    batches = []
+    for i in range(0, len(record_ids), _IDS_PER_LOOKUP):
+        clauses = [
+            f"RECORD_ID()={_formula_string(rid)}"
+            for rid in record_ids[i : i + _IDS_PER_LOOKUP]
+        ]
+        batches.append({
+            **_projection_params(CHUNK_PROJECTIONS, projection),
+            "filterByFormula": f"OR({','.join(clauses)})",
+        })
+    return batches
+
+
+def get_chunks_by_ids(record_ids: list[str], projection: str | None = None) -> list[dict]:
+    """Get specific chunks by record ID (unordered)."""
+    fields = CHUNK_PROJECTIONS.get(projection)
+    return [
+        _format_chunk(r, fields)
+        for params in _record_id_batches(record_ids, projection)
+        for r in _paginate(config.AIRTABLE_CHUNKS_TABLE_ID, params)
+    ]
+
+
+async def aget_chunks_by_ids(record_ids: list[str], projection: str | None = None) -> list[dict]:
+    """Async version of get_chunks_by_ids."""
+    fields = CHUNK_PROJECTIONS.get(projection)
+    return [
+        _format_chunk(r, fields)
+        for params in _record_id_batches(record_ids, projection)
+        async for r in _apaginate(config.AIRTABLE_CHUNKS_TABLE_ID, params)
+    ]
 
 
 def create_chunks(chunks: list[dict]) -> list[dict]:
@@ -144,7 +364,7 @@ def create_chunks(chunks: list[dict]) -> list[dict]:
     created = []
 
     for i in range(0, len(chunks), 10):
-        batch = chunks[i : i + 10]
+        batch = [_with_doc_record_id(c) for c in chunks[i : i + 10]]
         payload = {"records": [{"fields": c} for c in batch]}
         data = _request("POST", config.AIRTABLE_CHUNKS_TABLE_ID, json=payload)
         created.extend([_format_chunk(r) for r in data.get("records", [])])
@@ -152,10 +372,53 @@ def create_chunks(chunks: list[dict]) -> list[dict]:
     return created
 
 
+def update_chunks(updates: dict[str, dict]) -> list[dict]:
+    """
+    Update chunks in batches of 10.
+
+    Args:
+        updates: Dict mapping chunk record ID to the fields to set
+
+    Returns:
+        Updated chunks
+    """
+    records = [{"id": rid, "fields": fields} for rid, fields in updates.items()]
+    updated = []
+
+    for i in range(0, len(records), 10):
+        payload = {"records": records[i : i + 10]}
+        data = _request("PATCH", config.AIRTABLE_CHUNKS_TABLE_ID, json=payload)
+        updated.extend([_format_chunk(r) for r in data.get("records", [])])
+
+    return updated
+
+
+def _with_doc_record_id(fields: dict) -> dict:
+    """Mirror the linked doc_id into the filterable doc_record_id field."""
+    if fields.get("doc_record_id") or not fields.get("doc_id"):
+        return fields
+    return {**fields, "doc_record_id": fields["doc_id"][0]}
+
+
+def backfill_chunk_doc_ids() -> int:
+    """
+    One-off migration: set doc_record_id on chunks created before it existed.
+    Returns count of chunks updated.
+    """
+    params = {"filterByFormula": "{doc_record_id}=''", "fields[]": ["doc_id"]}
+    updates = {
+        r["id"]: {"doc_record_id": r["fields"]["doc_id"][0]}
+        for r in _paginate(config.AIRTABLE_CHUNKS_TABLE_ID, params)
+        if r.get("fields", {}).get("doc_id")
+    }
+    update_chunks(updates)
+    return len(updates)
+
+
 def delete_chunks_by_document(doc_record_id: str) -> int:
     """Delete all chunks for a document. Returns count deleted."""
     # First get all chunk record IDs
-    chunks = get_chunks_by_document(doc_record_id)
+    chunks = get_chunks_by_document(doc_record_id, projection="deletion")
     record_ids = [c["record_id"] for c in chunks]
 
     # Delete in batches of 10
@@ -167,19 +430,11 @@ def delete_chunks_by_document(doc_record_id: str) -> int:
     return len(record_ids)
 
 
-def _format_chunk(record: dict) -> dict:
-    """Convert Airtable record to API response format."""
-    fields = record.get("fields", {})
-    return {
-        "record_id": record["id"],
-        "chunk_id": fields.get("chunk_id"),  # If using auto-number
-        "doc_id": fields.get("doc_id", []),  # Linked record IDs
-        "sequence_number": fields.get("sequence_number"),
-        "chunk_type": fields.get("chunk_type"),
-        "content_raw": fields.get("content_raw"),
-        "content_summary": fields.get("content_summary"),
-        "image_url": fields.get("image_url"),
-        "heading_path": fields.get("heading_path"),
-        "token_count": fields.get("token_count"),
-        "source_pages": fields.get("source_pages"),
-    }
+def _format_chunk(record: dict, fields: list[str] | None = None) -> dict:
+    """Convert Airtable record to API response format (only `fields` if given)."""
+    return format_chunk(record["id"], record.get("fields", {}), fields)
+
+
+if __name__ == "__main__":
+    # python -m services.airtable: run the doc_record_id migration by hand
+    print(f"Backfilled doc_record_id on {backfill_chunk_doc_ids()} chunks")
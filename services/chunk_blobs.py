@@ -0,0 +1,123 @@
+"""
+Packed per-document chunk bodies in object storage.
+
+When CHUNK_BLOB_STORAGE is enabled, the pipeline writes every chunk body
+of a document into one blob (`chunks/{doc_id}/chunks.bin`): each body is
+zlib-compressed on its own and the frames are concatenated. Chunk records
+store `content_offset` and `content_length` of their frame instead of
+`content_raw`, so record reads stay small and bodies are not bound by the
+100k-character long text limit.
+
+Reading a single chunk is one ranged read; reading several chunks of a
+document downloads the blob once and keeps it in a local LRU cache. With
+the local object store the blob is already on disk, so every chunk is a
+ranged file read and the cache is skipped.
+Inline `content_raw` always takes precedence over a blob span (e.g. after
+a rename rewrites the first chunk).
+"""
+
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from services import gcs, metrics
+from services.disk_cache import DiskCache
+from services.object_store import objects
+
+_cache = DiskCache(config.CHUNK_BLOB_CACHE_DIR, config.CHUNK_BLOB_CACHE_MAX_BYTES)
+
+
+def _cache_key(doc_id: str) -> str:
+    return f"{doc_id}/chunks.bin"
+
+
+def pack(texts: list[str]) -> tuple[bytes, list[tuple[int, int]]]:
+    """
+    Pack chunk bodies into one blob.
+
+    Returns:
+        Tuple of (blob_bytes, [(offset, length), ...] per text)
+    """
+    frames = []
+    spans = []
+    offset = 0
+    for text in texts:
+        frame = zlib.compress(text.encode("utf-8"), 6)
+        frames.append(frame)
+        spans.append((offset, len(frame)))
+        offset += len(frame)
+    return b"".join(frames), spans
+
+
+def _unpack(frame: bytes) -> str:
+    """Decode one compressed frame."""
+    return zlib.decompress(frame).decode("utf-8")
+
+
+def write(doc_id: str, texts: list[str]) -> list[tuple[int, int]]:
+    """
+    Upload a document's packed chunk bodies (and keep a local copy).
+
+    Returns:
+        (offset, length) per text, to store on the chunk records
+    """
+    blob, spans = pack(texts)
+    gcs.upload_chunk_blob(doc_id, blob)
+    if not objects.is_local:
+        _cache.put(_cache_key(doc_id), blob)
+    return spans
+
+
+def _read_document(doc_id: str, chunks: list[dict]) -> None:
+    """Fill content_raw for chunks of one document from its blob."""
+    blob = None if objects.is_local else _cache.get(_cache_key(doc_id))
+
+    if blob is None and (len(chunks) == 1 or objects.is_local):
+        # Ranged reads: a single chunk needs no whole blob, and a local
+        # object store reads ranges straight from the file
+        for chunk in chunks:
+            start = chunk["content_offset"]
+            frame = gcs.download_chunk_blob(doc_id, start, start + chunk["content_length"] - 1)
+            chunk["content_raw"] = _unpack(frame)
+        return
+
+    if blob is None:
+        blob = gcs.download_chunk_blob(doc_id)
+        _cache.put(_cache_key(doc_id), blob)
+
+    for chunk in chunks:
+        start = chunk["content_offset"]
+        chunk["content_raw"] = _unpack(blob[start : start + chunk["content_length"]])
+
+
+def hydrate(chunks: list[dict]) -> list[dict]:
+    """
+    Fill in content_raw for blob-backed chunks, in place.
+
+    Chunks need doc_id, content_raw, content_offset and content_length (the
+    "assembly" projection). Chunks with inline content are left as is.
+    Returns the same list.
+    """
+    by_doc = defaultdict(list)
+    for chunk in chunks:
+        if chunk.get("content_raw") or chunk.get("content_length") is None:
+            continue
+        doc_id = chunk.get("doc_id")
+        if isinstance(doc_id, list):
+            doc_id = doc_id[0] if doc_id else None
+        if doc_id:
+            by_doc[doc_id].append(chunk)
+
+    if len(by_doc) == 1:
+        _read_document(*next(iter(by_doc.items())))
+    elif by_doc:
+        with ThreadPoolExecutor(max_workers=min(8, len(by_doc))) as executor:
+            list(executor.map(metrics.propagate(lambda item: _read_document(*item)), by_doc.items()))
+
+    return chunks
+
+
+def evict(doc_id: str) -> None:
+    """Drop a document's blob from the local cache."""
+    _cache.discard(doc_id)
@@ -0,0 +1,120 @@
+"""
+Size-bounded local file cache.
+
+Entries are files named by key under one directory. Writes are atomic
+(temp file + rename), reads refresh the entry's mtime, and once the total
+size exceeds `max_bytes` the least recently used entries are evicted.
+Safe to share between threads and between processes on one host.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import BinaryIO
+
+# Buffer size when copying streams into the cache
+_COPY_BUFFER = 1024 * 1024
+
+
+class DiskCache:
+    """LRU cache of byte blobs stored as files."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._evict_lock = threading.Lock()
+
+    def path(self, key: str) -> Path:
+        """File path for a key (keys may contain '/' to group entries)."""
+        return self.directory / key
+
+    def get_path(self, key: str) -> Path | None:
+        """Path of a cached entry, or None on a miss. Marks the entry as used."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get(self, key: str) -> bytes | None:
+        """Cached bytes for a key, or None on a miss."""
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None  # Evicted between lookup and read
+
+    def put(self, key: str, data: bytes) -> Path:
+        """Store bytes atomically. Returns the entry's path."""
+        return self._commit(key, lambda f: f.write(data))
+
+    def stage(self, src: BinaryIO) -> Path:
+        """
+        Copy a stream into a temp file in the cache directory, in chunks.
+
+        The staged file is not an entry yet (eviction ignores it): pass it to
+        commit() to make it one, or delete it with abandon().
+        """
+        return self._stage(lambda f: shutil.copyfileobj(src, f, _COPY_BUFFER))
+
+    def commit(self, key: str, staged: Path) -> Path:
+        """Move a staged file into place as `key`. Returns the entry's path."""
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(staged, path)
+        self._evict()
+        return path
+
+    def abandon(self, staged: Path) -> None:
+        """Delete a staged file that was not committed."""
+        staged.unlink(missing_ok=True)
+
+    def discard(self, key: str) -> None:
+        """Remove an entry (or every entry under a key prefix directory)."""
+        path = self.path(key)
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+    def _commit(self, key: str, write) -> Path:
+        """Write via a temp file in the cache directory, then rename into place."""
+        return self.commit(key, self._stage(write))
+
+    def _stage(self, write) -> Path:
+        """Write a temp file in the cache directory (same filesystem as entries)."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        return Path(tmp_path)
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until under max_bytes."""
+        with self._evict_lock:
+            entries = []
+            total = 0
+            for path in self.directory.rglob("*"):
+                if not path.is_file() or path.name.startswith(".tmp-"):
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
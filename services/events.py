@@ -0,0 +1,69 @@
+"""
+Document status events.
+
+Keeps a document-set version, bumped on every document write in this
+process, and fans status changes out to server-sent-event subscribers.
+Publishing is thread-safe: the pipeline runs in the threadpool while
+subscribers wait on the event loop.
+"""
+
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+# Events buffered per subscriber before new ones are dropped (a client that
+# falls behind can always resync from GET /api/documents)
+_QUEUE_SIZE = 100
+
+_lock = threading.Lock()
+_version = 0
+_subscribers: set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+
+
+def version() -> int:
+    """Current document-set version."""
+    return _version
+
+
+def publish(doc: dict, deleted: bool = False) -> None:
+    """Record a document change and notify subscribers."""
+    global _version
+    with _lock:
+        _version += 1
+        event = {
+            "doc_id": doc["record_id"],
+            "name": doc.get("name"),
+            "status": "deleted" if deleted else doc.get("status"),
+            "total_chunks": doc.get("total_chunks"),
+            "error_message": doc.get("error_message"),
+            "version": _version,
+        }
+        subscribers = list(_subscribers)
+
+    for loop, queue in subscribers:
+        try:
+            loop.call_soon_threadsafe(_deliver, queue, event)
+        except RuntimeError:
+            pass  # Subscriber's loop already closed
+
+
+def _deliver(queue: asyncio.Queue, event: dict) -> None:
+    """Enqueue on the subscriber's loop, dropping the event if it is full."""
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+
+@asynccontextmanager
+async def subscribe() -> AsyncIterator[asyncio.Queue]:
+    """Register a queue that receives every published event."""
+    entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=_QUEUE_SIZE))
+    with _lock:
+        _subscribers.add(entry)
+    try:
+        yield entry[1]
+    finally:
+        with _lock:
+            _subscribers.discard(entry)
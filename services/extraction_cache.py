@@ -0,0 +1,190 @@
+"""
+Content-addressed cache of Gemini page extractions.
+
+Revised uploads usually leave most pages unchanged, and many documents
+share identical cover, legal and appendix pages. Each page is keyed by a
+hash of its normalised content stream, its resources (fonts, images,
+XObjects) and its geometry, together with the extraction model and a hash
+of the prompt templates used (the page-range addendum included in document
+upload mode), so any change to the page, prompts or model is a miss.
+
+Entries live in a local LRU DiskCache and, when EXTRACTION_CACHE_SHARED is
+enabled, in object storage under `extraction-cache/` so every node (and
+every restart) shares them. A page's text is stored as extracted, with its
+original `[PAGE N]` marker; on a hit the marker, GRAPHIC_INSERT "page"
+fields and `graphic_p{N}_n` IDs are renumbered to the page's position in
+the new document.
+"""
+
+import hashlib
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from pypdf import PageObject
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+import config
+from services import metrics
+from services.disk_cache import DiskCache
+from services.object_store import objects
+
+logger = logging.getLogger(__name__)
+
+# Bump to invalidate every entry (e.g. after changing how pages are split)
+_FORMAT_VERSION = "1"
+_PAGE_MARKER = re.compile(r"^\[PAGE (\d+)\]", re.MULTILINE)
+# Parallel object-store lookups
+_SHARED_WORKERS = 16
+
+_cache = DiskCache(config.EXTRACTION_CACHE_DIR, config.EXTRACTION_CACHE_MAX_BYTES)
+
+
+def _fingerprint(obj, memo: dict, seen: frozenset = frozenset()) -> bytes:
+    """Stable digest of a PDF object, following references."""
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref in memo:
+            return memo[ref]
+        if ref in seen:
+            return b"cycle"  # e.g. /Parent links
+        digest = _fingerprint(obj.get_object(), memo, seen | {ref})
+        memo[ref] = digest
+        return digest
+
+    h = hashlib.sha256()
+    if isinstance(obj, StreamObject):
+        try:
+            data = obj.get_data()
+        except Exception:
+            data = obj._data  # Undecodable filter: hash the raw bytes
+        h.update(b"stream")
+        h.update(hashlib.sha256(data).digest())
+        obj = {k: v for k, v in obj.items() if k not in ("/Length", "/Filter", "/DecodeParms")}
+    if isinstance(obj, (DictionaryObject, dict)):
+        h.update(b"dict")
+        for key in sorted(obj):
+            if key == "/Parent":
+                continue
+            h.update(str(key).encode())
+            h.update(_fingerprint(obj[key], memo, seen))
+    elif isinstance(obj, (ArrayObject, list)):
+        h.update(b"array")
+        for item in obj:
+            h.update(_fingerprint(item, memo, seen))
+    else:
+        h.update(repr(obj).encode())
+    return h.digest()
+
+
+def page_key(page: PageObject, prompt: str, model: str, memo: dict) -> str:
+    """
+    Cache key for extracting one page.
+
+    Args:
+        page: The page in its source document
+        prompt: Extraction prompt templates as sent (with any addendum)
+        model: Gemini model name
+        memo: Per-document dict of already hashed objects (shared fonts etc.)
+    """
+    h = hashlib.sha256()
+    for part in (_FORMAT_VERSION, model, hashlib.sha256(prompt.encode()).hexdigest()):
+        h.update(part.encode())
+        h.update(b"\0")
+
+    contents = page.get_contents()
+    data = contents.get_data() if contents is not None else b""
+    h.update(b" ".join(data.split()))  # Whitespace-insensitive
+    h.update(_fingerprint(page.get("/Resources", {}), memo))
+    for box in ("/MediaBox", "/CropBox", "/Rotate"):
+        h.update(_fingerprint(page.get(box), memo))
+    return h.hexdigest()
+
+
+def _local_key(key: str) -> str:
+    return f"{key[:2]}/{key}.txt"
+
+
+def _object_key(key: str) -> str:
+    return f"extraction-cache/{key}.txt"
+
+
+def _renumber(text: str, page_num: int) -> str:
+    """Rewrite a cached page's own page number to `page_num`."""
+    match = _PAGE_MARKER.match(text)
+    if not match or int(match.group(1)) == page_num:
+        return text
+    old = match.group(1)
+    text = f"[PAGE {page_num}]" + text[match.end():]
+    text = re.sub(rf'("page"\s*:\s*){old}\b', rf"\g<1>{page_num}", text)
+    return re.sub(rf"\bgraphic_p{old}_n", f"graphic_p{page_num}_n", text)
+
+
+def _get_shared(key: str) -> str | None:
+    object_key = _object_key(key)
+    try:
+        with metrics.track(objects.name, "exists"):
+            if not objects.exists(object_key):
+                return None
+        with metrics.track(objects.name, "download") as call:
+            content = objects.download(object_key)
+            call.bytes_received = len(content)
+    except Exception as e:
+        logger.warning(f"Extraction cache read failed for {key}: {e}")
+        return None
+    _cache.put(_local_key(key), content)
+    return content.decode("utf-8")
+
+
+def get_pages(keys: dict[int, str]) -> dict[int, str]:
+    """
+    Cached extractions.
+
+    Args:
+        keys: Cache key per 1-indexed page number
+
+    Returns:
+        Extracted text (renumbered) for each page that hit
+    """
+    found: dict[int, str] = {}
+    misses = {}
+    for page_num, key in keys.items():
+        content = _cache.get(_local_key(key))
+        if content is not None:
+            found[page_num] = content.decode("utf-8")
+        else:
+            misses[page_num] = key
+
+    if misses and config.EXTRACTION_CACHE_SHARED:
+        with ThreadPoolExecutor(max_workers=min(_SHARED_WORKERS, len(misses))) as executor:
+            shared = executor.map(metrics.propagate(_get_shared), misses.values())
+            for page_num, text in zip(misses, shared):
+                if text is not None:
+                    found[page_num] = text
+
+    return {page_num: _renumber(text, page_num) for page_num, text in found.items()}
+
+
+def put_pages(keys: dict[int, str], extracted: str) -> None:
+    """
+    Cache a batch's extraction, split into pages at its [PAGE N] markers.
+
+    Nothing is cached unless the markers are exactly the batch's pages in
+    order (otherwise text can't be attributed to pages reliably).
+    """
+    markers = list(_PAGE_MARKER.finditer(extracted))
+    if [int(m.group(1)) for m in markers] != list(keys) or markers[0].start() != 0:
+        logger.info("Extraction cache: batch page markers don't match, not caching")
+        return
+
+    bounds = [m.start() for m in markers] + [len(extracted)]
+    for (page_num, key), start, end in zip(keys.items(), bounds, bounds[1:]):
+        content = extracted[start:end].strip().encode("utf-8")
+        _cache.put(_local_key(key), content)
+        if config.EXTRACTION_CACHE_SHARED:
+            try:
+                with metrics.track(objects.name, "upload") as call:
+                    objects.upload_bytes(_object_key(key), content, "text/plain; charset=utf-8")
+                    call.bytes_sent = len(content)
+            except Exception as e:
+                logger.warning(f"Extraction cache write failed for page {page_num}: {e}")
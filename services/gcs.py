@@ -1,106 +1,160 @@
+"""
+Document files in object storage.
+
+PDFs, images and packed chunk bodies are stored under per-document key
+prefixes in the backend selected by OBJECT_STORE_BACKEND (GCS, or the
+local filesystem; see services/object_store.py):
+
+    pdfs/{doc_id}/{filename}
+    images/{doc_id}/{image_id}.png
+    chunks/{doc_id}/chunks.bin
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from pathlib import Path
-from google.cloud import storage
-from google.oauth2 import service_account
 
 import config
+from services import metrics
+from services.object_store import objects
+from services.ttl_cache import MISSING, TTLCache
 
-# Initialize client with service account credentials
-_credentials = service_account.Credentials.from_service_account_file(
-    config.GCS_CREDENTIALS_JSON
-)
-_client = storage.Client(credentials=_credentials, project=_credentials.project_id)
-_bucket = _client.bucket(config.GCS_BUCKET_NAME)
+# Signed URLs are valid for an hour and cached until SIGNED_URL_CACHE_MARGIN
+# before they expire, so a URL handed out is always valid for at least that
+# long. Signing is local; the cache saves the listing/exists() round-trips.
+_SIGNED_URL_LIFETIME = timedelta(hours=1)
+URL_CACHE_TTL = _SIGNED_URL_LIFETIME.total_seconds() - config.SIGNED_URL_CACHE_MARGIN
+_MISSING_TTL = 60.0
+_url_cache = TTLCache()
 
 
-def upload_pdf(doc_id: str, filename: str, content: bytes) -> str:
+def upload_pdf(doc_id: str, filename: str, path: Path) -> str:
     """
-    Upload a PDF to GCS.
-    Returns the GCS URL.
+    Upload a PDF from a local file.
+
+    On GCS this is a resumable upload sent in GCS_UPLOAD_CHUNK_SIZE pieces,
+    so the file is never held in memory whole.
+    Returns the object's URL.
     """
-    blob_path = f"pdfs/{doc_id}/{filename}"
-    blob = _bucket.blob(blob_path)
-    blob.upload_from_string(content, content_type="application/pdf")
-    return f"gs://{config.GCS_BUCKET_NAME}/{blob_path}"
+    key = f"pdfs/{doc_id}/{filename}"
+    with metrics.track(objects.name, "upload") as call:
+        objects.upload_file(key, path, "application/pdf")
+        call.bytes_sent = path.stat().st_size
+    return objects.url(key)
 
 
 def upload_image(doc_id: str, image_id: str, content: bytes) -> str:
     """
-    Upload a cropped image to GCS.
+    Upload a cropped image.
     Returns a signed URL valid for 7 days.
     """
-    from datetime import timedelta
-
-    blob_path = f"images/{doc_id}/{image_id}.png"
-    blob = _bucket.blob(blob_path)
-    blob.upload_from_string(content, content_type="image/png")
+    key = f"images/{doc_id}/{image_id}.png"
+    with metrics.track(objects.name, "upload") as call:
+        objects.upload_bytes(key, content, "image/png")
+        call.bytes_sent = len(content)
 
     # Generate signed URL (valid for 7 days)
-    url = blob.generate_signed_url(
-        version="v4",
-        expiration=timedelta(days=7),
-        method="GET",
-    )
-    return url
+    return objects.signed_url(key, timedelta(days=7))
 
 
 def download_pdf(doc_id: str, filename: str) -> bytes:
-    """Download a PDF from GCS."""
-    blob_path = f"pdfs/{doc_id}/{filename}"
-    blob = _bucket.blob(blob_path)
-    return blob.download_as_bytes()
+    """Download a PDF."""
+    with metrics.track(objects.name, "download") as call:
+        content = objects.download(f"pdfs/{doc_id}/{filename}")
+        call.bytes_received = len(content)
+    return content
+
+
+def upload_chunk_blob(doc_id: str, content: bytes) -> str:
+    """
+    Upload a document's packed chunk bodies.
+    Returns the object's URL.
+    """
+    key = f"chunks/{doc_id}/chunks.bin"
+    with metrics.track(objects.name, "upload") as call:
+        objects.upload_bytes(key, content, "application/octet-stream")
+        call.bytes_sent = len(content)
+    return objects.url(key)
+
+
+def download_chunk_blob(doc_id: str, start: int | None = None, end: int | None = None) -> bytes:
+    """
+    Download a document's packed chunk bodies.
+
+    Args:
+        doc_id: Document record ID
+        start: First byte to read (default: start of blob)
+        end: Last byte to read, inclusive (default: end of blob)
+
+    Returns:
+        The requested bytes
+    """
+    with metrics.track(objects.name, "download") as call:
+        content = objects.download(f"chunks/{doc_id}/chunks.bin", start, end)
+        call.bytes_received = len(content)
+    return content
 
 
 def delete_document_files(doc_id: str) -> int:
     """
-    Delete all files for a document (PDF and images).
+    Delete all files for a document (PDF, images and packed chunks).
+
+    On GCS, objects are deleted in batch requests of 100 with
+    GCS_DELETE_CONCURRENCY batches in flight.
     Returns count of deleted files.
     """
-    count = 0
+    prefixes = [f"{prefix}/{doc_id}/" for prefix in ("pdfs", "images", "chunks")]
+    with ThreadPoolExecutor(max_workers=len(prefixes)) as executor:
+        keys = [key for listed in executor.map(metrics.propagate(_list), prefixes) for key in listed]
+
+    if keys:
+        with metrics.track(objects.name, "delete"):
+            objects.delete(keys)
 
-    # Delete PDFs
-    for blob in _bucket.list_blobs(prefix=f"pdfs/{doc_id}/"):
-        blob.delete()
-        count += 1
+    forget_urls(doc_id)
+    return len(keys)
 
-    # Delete images
-    for blob in _bucket.list_blobs(prefix=f"images/{doc_id}/"):
-        blob.delete()
-        count += 1
 
-    return count
+def _list(prefix: str) -> list[str]:
+    """List keys under a prefix."""
+    with metrics.track(objects.name, "list"):
+        return objects.list_keys(prefix)
 
 
-def list_images(doc_id: str) -> list[str]:
-    """List all image URLs for a document."""
-    urls = []
-    for blob in _bucket.list_blobs(prefix=f"images/{doc_id}/"):
-        urls.append(blob.public_url)
-    return urls
+def _signed_url(key: str) -> str:
+    """Signed GET URL (local computation, no round-trip)."""
+    return objects.signed_url(key, _SIGNED_URL_LIFETIME)
 
 
-def get_pdf_url(doc_id: str) -> str | None:
+def get_pdf_url(doc_id: str, pdf_url: str | None = None) -> str | None:
     """
     Get a signed URL for a document's PDF.
 
     Args:
         doc_id: Document record ID
+        pdf_url: The document's stored pdf_url, if known (skips listing)
 
     Returns:
-        Signed URL valid for 1 hour, or None if not found
+        Signed URL valid for at least SIGNED_URL_CACHE_MARGIN, or None if
+        not found
     """
-    from datetime import timedelta
-
-    # Find the PDF blob (there should be only one per doc)
-    blobs = list(_bucket.list_blobs(prefix=f"pdfs/{doc_id}/"))
-    if not blobs:
-        return None
-
-    blob = blobs[0]
-    return blob.generate_signed_url(
-        version="v4",
-        expiration=timedelta(hours=1),
-        method="GET",
-    )
+    cache_key = (doc_id, "pdf")
+    url = _url_cache.get(cache_key)
+    if url is not MISSING:
+        return url
+
+    if pdf_url:
+        key = objects.key_from_url(pdf_url)
+    else:
+        # Find the PDF (there should be only one per doc)
+        keys = _list(f"pdfs/{doc_id}/")
+        if not keys:
+            return None
+        key = keys[0]
+
+    url = _signed_url(key)
+    _url_cache.put(cache_key, url, URL_CACHE_TTL)
+    return url
 
 
 def get_page_image_url(doc_id: str, page_num: int) -> str | None:
@@ -112,18 +166,27 @@ def get_page_image_url(doc_id: str, page_num: int) -> str | None:
         page_num: 1-indexed page number
 
     Returns:
-        Signed URL valid for 1 hour, or None if not found
+        Signed URL valid for at least SIGNED_URL_CACHE_MARGIN, or None if
+        not found
     """
-    from datetime import timedelta
+    cache_key = (doc_id, "page", page_num)
+    url = _url_cache.get(cache_key)
+    if url is not MISSING:
+        return url
+
+    key = f"images/{doc_id}/page_{page_num}.png"
+    with metrics.track(objects.name, "exists"):
+        exists = objects.exists(key)
+    if not exists:
+        # Remember misses briefly too; page images are rarely rendered
+        _url_cache.put(cache_key, None, _MISSING_TTL)
+        return None
 
-    blob_path = f"images/{doc_id}/page_{page_num}.png"
-    blob = _bucket.blob(blob_path)
+    url = _signed_url(key)
+    _url_cache.put(cache_key, url, URL_CACHE_TTL)
+    return url
 
-    if not blob.exists():
-        return None
 
-    return blob.generate_signed_url(
-        version="v4",
-        expiration=timedelta(hours=1),
-        method="GET",
-    )
+def forget_urls(doc_id: str) -> None:
+    """Drop cached signed URLs for a document (e.g. after deleting it)."""
+    _url_cache.invalidate(doc_id)
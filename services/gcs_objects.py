@@ -0,0 +1,110 @@
+"""
+Google Cloud Storage object store backend.
+
+The client is created on first use rather than at import, so importing
+the app (or running it with the local backend) needs no credentials.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from google.cloud import storage
+from google.oauth2 import service_account
+
+import config
+from services import metrics
+
+# Deletes are sent as batch requests of up to _DELETE_BATCH_SIZE objects,
+# with GCS_DELETE_CONCURRENCY batches in flight
+_DELETE_BATCH_SIZE = 100
+
+
+class GCSObjectStore:
+    """Objects in one GCS bucket."""
+
+    name = "gcs"
+    is_local = False
+
+    def __init__(self, bucket_name: str, credentials_path: str):
+        self.bucket_name = bucket_name
+        self._credentials_path = credentials_path
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._client: storage.Client | None = None
+        self._thread_clients = threading.local()
+
+    def _new_client(self) -> storage.Client:
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = service_account.Credentials.from_service_account_file(
+                    self._credentials_path
+                )
+        return storage.Client(credentials=self._credentials, project=self._credentials.project_id)
+
+    def _bucket(self) -> storage.Bucket:
+        """The shared client's bucket, creating the client on first use."""
+        if self._client is None:
+            client = self._new_client()
+            with self._lock:
+                if self._client is None:
+                    self._client = client
+        return self._client.bucket(self.bucket_name)
+
+    def url(self, key: str) -> str:
+        return f"gs://{self.bucket_name}/{key}"
+
+    def key_from_url(self, url: str) -> str:
+        return url.removeprefix(f"gs://{self.bucket_name}/")
+
+    def upload_file(self, key: str, source: Path, content_type: str) -> None:
+        """Resumable upload in GCS_UPLOAD_CHUNK_SIZE pieces (never whole in memory)."""
+        blob = self._bucket().blob(key, chunk_size=config.GCS_UPLOAD_CHUNK_SIZE)
+        blob.upload_from_filename(str(source), content_type=content_type)
+
+    def upload_bytes(self, key: str, content: bytes, content_type: str) -> None:
+        self._bucket().blob(key).upload_from_string(content, content_type=content_type)
+
+    def download(self, key: str, start: int | None = None, end: int | None = None) -> bytes:
+        """Object bytes, or the inclusive range start..end."""
+        return self._bucket().blob(key).download_as_bytes(start=start, end=end)
+
+    def exists(self, key: str) -> bool:
+        return self._bucket().blob(key).exists()
+
+    def list_keys(self, prefix: str) -> list[str]:
+        """Keys under a prefix (all pages)."""
+        return [blob.name for blob in self._bucket().list_blobs(prefix=prefix)]
+
+    def delete(self, keys: list[str]) -> None:
+        """Delete objects in parallel batch requests (missing ones are ignored)."""
+        batches = [keys[i : i + _DELETE_BATCH_SIZE] for i in range(0, len(keys), _DELETE_BATCH_SIZE)]
+        if len(batches) <= 1:
+            for batch in batches:
+                self._delete_batch(batch)
+            return
+        with ThreadPoolExecutor(max_workers=config.GCS_DELETE_CONCURRENCY) as executor:
+            list(executor.map(metrics.propagate(self._delete_batch), batches))
+
+    def _delete_batch(self, keys: list[str]) -> None:
+        """Delete up to 100 objects in one batch request."""
+        # A client's batch context is not thread-safe, so each worker thread
+        # batches on its own client
+        client = getattr(self._thread_clients, "client", None)
+        if client is None:
+            client = self._new_client()
+            self._thread_clients.client = client
+        bucket = client.bucket(self.bucket_name)
+
+        with client.batch(raise_exception=False):
+            for key in keys:
+                bucket.blob(key).delete()
+
+    def signed_url(self, key: str, lifetime: timedelta) -> str:
+        """V4 signed URL (signed locally, no round-trip)."""
+        return self._bucket().blob(key).generate_signed_url(
+            version="v4",
+            expiration=lifetime,
+            method="GET",
+        )
@@ -0,0 +1,142 @@
+"""
+Local filesystem object store backend.
+
+Objects are files under one root directory, named by key. Writes go to a
+temp file in the target directory and are renamed into place, so readers
+never see partial objects. Ranged reads read only the requested bytes
+(one pread); the result is a copy, like any other backend's.
+
+Signed URLs are emulated: `signed_url()` returns a link to the API's
+GET /api/objects/{key} route (routers/objects.py) carrying an expiry and
+an HMAC-SHA256 signature, and the route serves the file (sendfile) only
+if the signature is valid and unexpired. The signing key is generated
+once and kept in the root directory, so URLs survive restarts.
+"""
+
+import hashlib
+import hmac
+import os
+import secrets
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import quote, urlencode
+
+_KEY_FILE = ".signing-key"
+
+
+class LocalObjectStore:
+    """Objects stored as files under `root`."""
+
+    name = "local"
+    is_local = True
+
+    def __init__(self, root: str, public_url: str):
+        self.root = Path(root).resolve()
+        self.public_url = public_url.rstrip("/")
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._secret = self._load_secret()
+
+    def _load_secret(self) -> bytes:
+        """Read the signing key, creating it on first start."""
+        path = self.root / _KEY_FILE
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            return path.read_bytes()
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+        return path.read_bytes()
+
+    def path(self, key: str) -> Path:
+        """File for a key; rejects keys that escape the root."""
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root) or path == self.root or path.name == _KEY_FILE:
+            raise ValueError(f"Invalid object key: {key}")
+        return path
+
+    def url(self, key: str) -> str:
+        return f"local://{key}"
+
+    def key_from_url(self, url: str) -> str:
+        return url.removeprefix("local://")
+
+    def _write(self, key: str, write) -> None:
+        """Write via a temp file in the target directory, then rename into place."""
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def upload_file(self, key: str, source: Path, content_type: str) -> None:
+        with open(source, "rb") as src:
+            self._write(key, lambda f: shutil.copyfileobj(src, f, 1024 * 1024))
+
+    def upload_bytes(self, key: str, content: bytes, content_type: str) -> None:
+        self._write(key, lambda f: f.write(content))
+
+    def download(self, key: str, start: int | None = None, end: int | None = None) -> bytes:
+        """Object bytes, or the inclusive range start..end."""
+        with open(self.path(key), "rb") as f:
+            start = start or 0
+            stop = os.fstat(f.fileno()).st_size if end is None else end + 1
+            return os.pread(f.fileno(), max(0, stop - start), start)
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    def list_keys(self, prefix: str) -> list[str]:
+        """Keys under a prefix."""
+        base = self.root / prefix
+        directory = base if prefix.endswith("/") else base.parent
+        if not directory.is_dir():
+            return []
+        keys = []
+        for path in directory.rglob("*"):
+            if path.is_file() and not path.name.startswith(".tmp-"):
+                key = path.relative_to(self.root).as_posix()
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+    def delete(self, keys: list[str]) -> None:
+        """Delete objects (missing ones are ignored) and prune empty directories."""
+        for key in keys:
+            path = self.path(key)
+            path.unlink(missing_ok=True)
+            parent = path.parent
+            while parent != self.root:
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break  # Not empty
+                parent = parent.parent
+
+    def _signature(self, key: str, expires: int) -> str:
+        message = f"{key}\n{expires}".encode()
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+
+    def signed_url(self, key: str, lifetime: timedelta) -> str:
+        """URL of the API's object route, valid for `lifetime`."""
+        expires = int(time.time() + lifetime.total_seconds())
+        query = urlencode({"expires": expires, "signature": self._signature(key, expires)})
+        return f"{self.public_url}/api/objects/{quote(key)}?{query}"
+
+    def open_signed(self, key: str, expires: int, signature: str) -> Path | None:
+        """
+        Path for a signed URL's key (which may not exist), or None if the
+        signature is bad or expired.
+        """
+        if expires < time.time():
+            return None
+        if not hmac.compare_digest(signature, self._signature(key, expires)):
+            return None
+        return self.path(key)
@@ -0,0 +1,179 @@
+"""
+Outbound I/O instrumentation.
+
+Every call to Airtable, GCS and the LLM APIs runs inside `track()`, which
+records call count, latency, bytes sent/received, retries and errors per
+(service, operation). Time spent waiting on rate limiters and retry
+backoff is recorded separately with `record_wait()`.
+
+Totals are exported in Prometheus text format by GET /metrics. Work done
+inside `caller("doc:...")` / `caller("query:...")` is also summed per
+caller and logged when the block exits (METRICS_LOG_SUMMARY).
+Thread pools must wrap their tasks with `propagate()` so calls made on
+worker threads are attributed to the submitting caller.
+"""
+
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, fields
+from typing import Callable, Iterator
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CallStats:
+    """Accumulated counters for one (service, operation)."""
+
+    calls: int = 0
+    errors: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    wait_seconds: float = 0.0
+
+    def add(self, other: "CallStats") -> None:
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+
+
+@dataclass
+class Call:
+    """Handle yielded by track(); the caller fills in sizes and retries."""
+
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    retries: int = 0
+
+
+_lock = threading.Lock()
+_totals: dict[tuple[str, str], CallStats] = {}
+
+# Per-caller accumulator
+_summary: contextvars.ContextVar[dict | None] = contextvars.ContextVar(
+    "metrics_summary", default=None
+)
+
+
+def _record(service: str, operation: str, stats: CallStats) -> None:
+    key = (service, operation)
+    summary = _summary.get()
+    with _lock:
+        _totals.setdefault(key, CallStats()).add(stats)
+        if summary is not None:
+            summary.setdefault(key, CallStats()).add(stats)
+
+
+@contextmanager
+def track(service: str, operation: str) -> Iterator[Call]:
+    """Time one outbound call (including its retries)."""
+    call = Call()
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield call
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _record(
+            service,
+            operation,
+            CallStats(
+                calls=1,
+                errors=int(failed),
+                retries=call.retries,
+                seconds=time.perf_counter() - start,
+                bytes_sent=call.bytes_sent,
+                bytes_received=call.bytes_received,
+            ),
+        )
+
+
+def record_wait(service: str, seconds: float, operation: str = "rate_limit") -> None:
+    """Record time spent waiting on a rate limiter or retry backoff."""
+    if seconds > 0:
+        _record(service, operation, CallStats(wait_seconds=seconds))
+
+
+def text_size(*parts: str | None) -> int:
+    """UTF-8 size of prompt/response text, for LLM byte counts."""
+    return sum(len(p.encode("utf-8")) for p in parts if p)
+
+
+@contextmanager
+def caller(tag: str) -> Iterator[None]:
+    """Attribute outbound calls in this block to `tag` and log a summary."""
+    summary: dict[tuple[str, str], CallStats] = {}
+    summary_token = _summary.set(summary)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _summary.reset(summary_token)
+        if config.METRICS_LOG_SUMMARY and summary:
+            logger.info(_format_summary(tag, time.perf_counter() - start, summary))
+
+
+def propagate(fn: Callable) -> Callable:
+    """Wrap `fn` to run in a copy of the current context (for thread pools)."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+def _format_summary(tag: str, elapsed: float, summary: dict) -> str:
+    lines = [f"I/O summary for {tag} ({elapsed:.1f}s wall):"]
+    for (service, operation), s in sorted(summary.items()):
+        line = f"  {service} {operation}:"
+        if s.calls:
+            line += (
+                f" {s.calls} calls, {s.seconds:.2f}s, "
+                f"{s.bytes_sent}B sent, {s.bytes_received}B received"
+            )
+            if s.retries:
+                line += f", {s.retries} retries"
+            if s.errors:
+                line += f", {s.errors} errors"
+        if s.wait_seconds:
+            line += f" {s.wait_seconds:.2f}s waiting"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+_METRICS = [
+    ("calls", "docuquery_outbound_calls_total", "Outbound calls"),
+    ("errors", "docuquery_outbound_errors_total", "Outbound calls that raised"),
+    ("retries", "docuquery_outbound_retries_total", "Retries inside outbound calls"),
+    ("seconds", "docuquery_outbound_seconds_total", "Wall time spent in outbound calls"),
+    ("bytes_sent", "docuquery_outbound_bytes_sent_total", "Request bytes sent"),
+    ("bytes_received", "docuquery_outbound_bytes_received_total", "Response bytes received"),
+    ("wait_seconds", "docuquery_outbound_wait_seconds_total", "Time waiting on rate limits/backoff"),
+]
+
+
+def render_prometheus() -> str:
+    """Export totals in Prometheus text exposition format."""
+    with _lock:
+        totals = {key: CallStats(**vars(stats)) for key, stats in _totals.items()}
+
+    lines = []
+    for attr, name, help_text in _METRICS:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for (service, operation), stats in sorted(totals.items()):
+            value = getattr(stats, attr)
+            if value:
+                lines.append(f'{name}{{service="{service}",operation="{operation}"}} {value}')
+    return "\n".join(lines) + "\n"
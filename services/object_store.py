@@ -0,0 +1,56 @@
+"""
+Object storage for PDFs, page/graphic images and packed chunk bodies.
+
+`objects` is the backend selected by OBJECT_STORE_BACKEND: Google Cloud
+Storage (default) or a directory on local disk ("local") for single-node
+deployments, load tests and benchmarks without the cloud. Backends store
+opaque objects by key (e.g. "pdfs/{doc_id}/{filename}"); the document-
+level helpers built on them live in services/gcs.py.
+"""
+
+from datetime import timedelta
+from pathlib import Path
+from typing import Protocol
+
+import config
+
+
+class ObjectStore(Protocol):
+    """Operations every object storage backend provides."""
+
+    # Label for metrics ("gcs" / "local")
+    name: str
+    # True when objects are files on this node (reads are cheap)
+    is_local: bool
+
+    # Canonical URL stored on records (gs://bucket/key, local://key)
+    def url(self, key: str) -> str: ...
+    def key_from_url(self, url: str) -> str: ...
+
+    def upload_file(self, key: str, source: Path, content_type: str) -> None: ...
+    def upload_bytes(self, key: str, content: bytes, content_type: str) -> None: ...
+    def download(self, key: str, start: int | None = None, end: int | None = None) -> bytes: ...
+    def exists(self, key: str) -> bool: ...
+    def list_keys(self, prefix: str) -> list[str]: ...
+    def delete(self, keys: list[str]) -> None: ...
+
+    # Time-limited GET URL a browser can open directly
+    def signed_url(self, key: str, lifetime: timedelta) -> str: ...
+
+
+def _create_object_store() -> ObjectStore:
+    """Instantiate the configured backend."""
+    if config.OBJECT_STORE_BACKEND == "gcs":
+        from services.gcs_objects import GCSObjectStore
+
+        return GCSObjectStore(config.GCS_BUCKET_NAME, config.GCS_CREDENTIALS_JSON)
+
+    if config.OBJECT_STORE_BACKEND == "local":
+        from services.local_objects import LocalObjectStore
+
+        return LocalObjectStore(config.OBJECT_STORE_PATH, config.OBJECT_STORE_PUBLIC_URL)
+
+    raise ValueError(f"Unsupported OBJECT_STORE_BACKEND: {config.OBJECT_STORE_BACKEND}")
+
+
+objects: ObjectStore = _create_object_store()
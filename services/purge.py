@@ -0,0 +1,40 @@
+"""
+Background purge of deleted documents.
+
+DELETE /api/documents/{doc_id} only tombstones the document (status
+"deleting"), which hides it from listings and queries at once. The
+chunks, GCS objects and finally the document record are removed here,
+off the request path. A purge that fails or is cut short by a restart
+leaves the tombstone in place, and `sweep()` retries it on startup.
+"""
+
+import logging
+
+from services import chunk_blobs, gcs, spool
+from services.store import store
+
+logger = logging.getLogger(__name__)
+
+DELETING = "deleting"
+
+
+def purge_document(doc_id: str, delete_record: bool = True) -> None:
+    """Remove a tombstoned document's chunks, files and (last) its record."""
+    try:
+        store.delete_chunks_by_document(doc_id)
+        gcs.delete_document_files(doc_id)
+        chunk_blobs.evict(doc_id)
+        spool.discard(doc_id)
+        if delete_record:
+            store.delete_document(doc_id)
+    except Exception:
+        logger.exception(f"Purge of {doc_id} failed; retrying on next startup")
+
+
+def sweep() -> int:
+    """Purge documents left tombstoned by an earlier process. Returns count."""
+    docs = store.list_documents(projection="listing")
+    pending = [d["record_id"] for d in docs if d.get("status") == DELETING]
+    for doc_id in pending:
+        purge_document(doc_id)
+    return len(pending)
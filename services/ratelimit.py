@@ -0,0 +1,183 @@
+"""
+Rate limiting for external APIs: token buckets and adaptive concurrency.
+
+A bucket can be shared by threads (threadpool endpoints, the background
+pipeline) and asyncio tasks (the query path). Callers reserve a token
+under a lock and sleep outside it, so waiting never blocks other callers'
+bookkeeping. When a state file is given, the bucket lives in SQLite and
+every process on the host draws from the same budget.
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class TokenBucket:
+    """Token bucket allowing `rate` requests/second with bursts of `capacity`."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1.0,
+        state_path: str | None = None,
+        name: str = "default",
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.name = name
+        self._lock = threading.Lock()
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+        self._state_path = state_path
+        self._local = threading.local()
+        if state_path:
+            Path(state_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = self._connection()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection to the shared state file."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._state_path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _adjust(
+        self, tokens: float, elapsed: float, cost: float, floor: float | None
+    ) -> tuple[float, float]:
+        """Refill for `elapsed` seconds, then take `cost` (or drop to `floor`).
+
+        Returns (new_tokens, seconds_to_wait). Tokens may go negative: a
+        negative balance is the queue of reservations still waiting.
+        """
+        tokens = min(self.capacity, tokens + elapsed * self.rate)
+        if floor is not None:
+            return min(tokens, floor), 0.0
+        tokens -= cost
+        wait = -tokens / self.rate if tokens < 0 else 0.0
+        return tokens, wait
+
+    def _update(self, cost: float = 1.0, floor: float | None = None) -> float:
+        """Apply a reservation or penalty atomically. Returns seconds to wait."""
+        if not self._state_path:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens, wait = self._adjust(self._tokens, now - self._updated, cost, floor)
+                self._updated = now
+                return wait
+
+        # Wall-clock time, since monotonic clocks are not comparable across processes
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            tokens, updated = row if row else (self.capacity, now)
+            tokens, wait = self._adjust(tokens, max(0.0, now - updated), cost, floor)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (self.name, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self) -> float:
+        """Block until a token is available. Returns seconds waited."""
+        wait = self._update()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self) -> float:
+        """Wait for a token without blocking the event loop. Returns seconds waited."""
+        if self._state_path:
+            wait = await asyncio.to_thread(self._update)
+        else:
+            wait = self._update()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def penalize(self, seconds: float) -> None:
+        """Hold back every caller for `seconds` (e.g. after a 429)."""
+        self._update(floor=-seconds * self.rate)
+
+    async def apenalize(self, seconds: float) -> None:
+        """penalize() without blocking the event loop."""
+        if self._state_path:
+            await asyncio.to_thread(self._update, floor=-seconds * self.rate)
+        else:
+            self._update(floor=-seconds * self.rate)
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit that adapts to rate limiting (AIMD).
+
+    Callers hold a slot (`with limiter:`) for each request. Every success
+    raises the limit by 1/limit (about +1 per round of requests, up to
+    `maximum`); a rate-limit response halves it (down to `minimum`). Halving
+    happens at most once per `cooldown` seconds, since one overload is
+    usually reported by every request that was in flight.
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1, cooldown: float = 5.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.cooldown = cooldown
+        self._limit = float(min(max(initial, minimum), maximum))
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """Current number of slots."""
+        return int(self._limit)
+
+    def acquire(self) -> None:
+        """Block until a slot is free."""
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def __enter__(self) -> "AdaptiveConcurrency":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+    def succeeded(self) -> None:
+        """Additive increase after a successful request."""
+        with self._cond:
+            self._limit = min(self.maximum, self._limit + 1.0 / self._limit)
+            self._cond.notify_all()
+
+    def rate_limited(self) -> None:
+        """Multiplicative decrease after a rate-limit response."""
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self._limit = max(self.minimum, self._limit / 2)
+                self._last_decrease = now
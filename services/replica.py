@@ -0,0 +1,211 @@
+"""
+Local read replica of Airtable.
+
+Airtable stays the system of record; this store serves reads (document
+list, per-document chunks, the query corpus) from a local SQLite copy.
+The copy is kept current by:
+- write-through: every write goes to Airtable and the returned records
+  are upserted locally
+- delta sync: a background thread pulls records modified since the last
+  sync (LAST_MODIFIED_TIME() filter) every REPLICA_SYNC_INTERVAL seconds
+- reconciliation: every REPLICA_FULL_SYNC_INTERVAL seconds record IDs are
+  listed to drop records deleted elsewhere (deltas can't show deletions)
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from services import airtable
+from services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Re-read records modified slightly before the last cursor, to cover clock
+# skew and writes that landed while the previous sync was paging
+_CURSOR_OVERLAP = timedelta(seconds=60)
+_CURSOR_KEY = "airtable_sync_cursor"
+
+
+class ReplicatedStore:
+    """Airtable-backed store that serves reads from a local SQLite replica."""
+
+    def __init__(self, path: str, sync_interval: float, full_sync_interval: float):
+        self._replica = SQLiteStore(path)
+        self._sync_interval = sync_interval
+        self._full_sync_interval = full_sync_interval
+        self._sync_lock = threading.Lock()
+        self._last_full_sync = 0.0
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # --- Sync ---
+
+    def sync(self, full: bool = False) -> None:
+        """
+        Pull changes from Airtable; when `full`, also drop records deleted
+        there.
+
+        Full records are only fetched for the delta since the last sync (all
+        records on the first sync); deletions are found by listing record
+        IDs alone.
+        """
+        with self._sync_lock:
+            started = datetime.now(timezone.utc)
+            cursor = self._replica.get_meta(_CURSOR_KEY)
+
+            documents = airtable.list_documents(modified_since=cursor)
+            chunks = airtable.list_chunks(modified_since=cursor)
+            self._replica.upsert_documents(documents)
+            self._replica.upsert_chunks(chunks)
+
+            if full:
+                if cursor is not None:
+                    documents = airtable.list_documents(projection="deletion")
+                    chunks = airtable.list_chunks(projection="deletion")
+                self._replica.prune("documents", {d["record_id"] for d in documents})
+                self._replica.prune("chunks", {c["record_id"] for c in chunks})
+                self._last_full_sync = time.monotonic()
+
+            self._replica.set_meta(_CURSOR_KEY, (started - _CURSOR_OVERLAP).isoformat())
+            logger.info(
+                f"Replica {'full' if full else 'delta'} sync: "
+                f"{len(documents)} documents, {len(chunks)} chunks"
+            )
+
+    def _ensure_started(self) -> None:
+        """Bootstrap on first use, then keep syncing in the background."""
+        if self._ready.is_set():
+            return
+        with self._sync_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="airtable-replica", daemon=True
+                )
+                self._thread.start()
+        self._ready.wait()
+
+    async def _aensure_started(self) -> None:
+        """Async version of _ensure_started (bootstrap runs off the event loop)."""
+        if not self._ready.is_set():
+            await asyncio.to_thread(self._ensure_started)
+
+    def _run(self) -> None:
+        """Background sync loop."""
+        try:
+            self.sync(full=self._replica.get_meta(_CURSOR_KEY) is None)
+        except Exception:
+            logger.exception("Initial replica sync failed; serving local data")
+        self._ready.set()
+
+        while not self._stop.wait(self._sync_interval):
+            full = time.monotonic() - self._last_full_sync >= self._full_sync_interval
+            try:
+                self.sync(full=full)
+            except Exception:
+                logger.exception("Replica sync failed")
+
+    def close(self) -> None:
+        """Stop the sync thread and release the replica and Airtable clients."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._replica.close()
+        airtable.close()
+
+    async def aclose(self) -> None:
+        """Release the async Airtable client."""
+        await airtable.aclose()
+
+    # --- Documents ---
+
+    def list_documents(self, projection: str | None = None) -> list[dict]:
+        """List all documents from the replica."""
+        self._ensure_started()
+        return self._replica.list_documents(projection)
+
+    async def alist_documents(self, projection: str | None = None) -> list[dict]:
+        """Async version of list_documents."""
+        await self._aensure_started()
+        return await self._replica.alist_documents(projection)
+
+    def get_document(self, record_id: str) -> dict | None:
+        """Get a document, falling back to Airtable if not replicated yet."""
+        self._ensure_started()
+        doc = self._replica.get_document(record_id)
+        if doc is None:
+            doc = airtable.get_document(record_id)
+            if doc is not None:
+                self._replica.upsert_documents([doc])
+        return doc
+
+    def create_document(self, fields: dict) -> dict:
+        """Create in Airtable and write through to the replica."""
+        doc = airtable.create_document(fields)
+        self._replica.upsert_documents([doc])
+        return doc
+
+    def update_document(self, record_id: str, fields: dict) -> dict:
+        """Update in Airtable and write through to the replica."""
+        doc = airtable.update_document(record_id, fields)
+        self._replica.upsert_documents([doc])
+        return doc
+
+    def delete_document(self, record_id: str) -> None:
+        """Delete from Airtable and the replica."""
+        airtable.delete_document(record_id)
+        self._replica.delete_document(record_id)
+
+    # --- Chunks ---
+
+    def list_chunks(self, projection: str | None = None) -> list[dict]:
+        """List all chunks from the replica."""
+        self._ensure_started()
+        return self._replica.list_chunks(projection)
+
+    async def alist_chunks(self, projection: str | None = None) -> list[dict]:
+        """Async version of list_chunks."""
+        await self._aensure_started()
+        return await self._replica.alist_chunks(projection)
+
+    def get_chunks_by_document(
+        self, doc_record_id: str, projection: str | None = None
+    ) -> list[dict]:
+        """Get a document's chunks from the replica."""
+        self._ensure_started()
+        return self._replica.get_chunks_by_document(doc_record_id, projection)
+
+    def get_chunks_by_ids(self, record_ids: list[str], projection: str | None = None) -> list[dict]:
+        """Get specific chunks from the replica."""
+        self._ensure_started()
+        return self._replica.get_chunks_by_ids(record_ids, projection)
+
+    async def aget_chunks_by_ids(
+        self, record_ids: list[str], projection: str | None = None
+    ) -> list[dict]:
+        """Async version of get_chunks_by_ids."""
+        await self._aensure_started()
+        return await self._replica.aget_chunks_by_ids(record_ids, projection)
+
+    def create_chunks(self, chunks: list[dict]) -> list[dict]:
+        """Create in Airtable and write through to the replica."""
+        created = airtable.create_chunks(chunks)
+        self._replica.upsert_chunks(created)
+        return created
+
+    def update_chunks(self, updates: dict[str, dict]) -> list[dict]:
+        """Update in Airtable and write through to the replica."""
+        updated = airtable.update_chunks(updates)
+        self._replica.upsert_chunks(updated)
+        return updated
+
+    def delete_chunks_by_document(self, doc_record_id: str) -> int:
+        """Delete a document's chunks from Airtable and the replica."""
+        # Ask Airtable (not the replica) which chunks exist, so chunks not
+        # yet replicated are deleted too
+        count = airtable.delete_chunks_by_document(doc_record_id)
+        self._replica.delete_chunks_by_document(doc_record_id)
+        return count
@@ -0,0 +1,81 @@
+"""
+Record shapes shared by the storage backends.
+
+Every backend returns documents and chunks as flat dicts keyed by these
+field names plus `record_id`, so callers never see backend-specific
+records. Named projections select the fields each call site needs.
+"""
+
+import config
+
+DOCUMENT_FIELDS = [
+    "doc_id",  # Auto-number
+    "name",
+    "status",
+    "pdf_url",
+    "total_chunks",
+    "total_pages",
+    "upload_date",
+    "error_message",
+]
+
+CHUNK_FIELDS = [
+    "chunk_id",  # Auto-number
+    "doc_id",  # Linked record IDs, e.g. ["recXXX"]
+    "doc_record_id",
+    "sequence_number",
+    "chunk_type",
+    "content_raw",
+    "content_offset",  # Packed blob frame (see services/chunk_blobs.py)
+    "content_length",
+    "content_summary",
+    "image_url",
+    "heading_path",
+    "token_count",
+    "source_pages",
+]
+
+# Named field projections for list calls. Records only carry the listed
+# fields (plus record_id); projection=None returns every field.
+DOCUMENT_PROJECTIONS = {
+    # GET /api/documents and the query path's ready-document lookup
+    "listing": ["name", "status", "total_chunks", "total_pages", "upload_date"],
+    # Record IDs are always returned; ask for one small field
+    "deletion": ["status"],
+}
+CHUNK_PROJECTIONS = {
+    # Everything the router and assembler need except the large content_raw
+    "routing": [
+        "doc_id",
+        "sequence_number",
+        "chunk_type",
+        "content_summary",
+        "image_url",
+        "heading_path",
+        "source_pages",
+    ],
+    # Full content (inline, or a packed blob span when CHUNK_BLOB_STORAGE
+    # is on), fetched only for chunks the router selected. The span fields
+    # are only requested when blobs are in use: Airtable rejects fields a
+    # base doesn't have
+    "assembly": ["doc_id", "sequence_number", "content_raw"]
+    + (["content_offset", "content_length"] if config.CHUNK_BLOB_STORAGE else []),
+    # Record IDs are always returned; ask for one small field
+    "deletion": ["sequence_number"],
+}
+
+
+def format_document(record_id: str, data: dict, fields: list[str] | None = None) -> dict:
+    """Build a document dict from raw field values (only `fields` if given)."""
+    document = {"record_id": record_id}
+    for key in fields or DOCUMENT_FIELDS:
+        document[key] = data.get(key)
+    return document
+
+
+def format_chunk(record_id: str, data: dict, fields: list[str] | None = None) -> dict:
+    """Build a chunk dict from raw field values (only `fields` if given)."""
+    chunk = {"record_id": record_id}
+    for key in fields or CHUNK_FIELDS:
+        chunk[key] = data.get(key, [] if key == "doc_id" else None)
+    return chunk
@@ -0,0 +1,59 @@
+"""
+Local spool of uploaded PDFs.
+
+The upload handler keeps a copy of each PDF on local disk, keyed by
+document ID, so the pipeline can start from it instead of downloading
+the file straight back from GCS. The spool is a size-bounded LRU cache:
+after a restart, on another node, or once a PDF has been evicted, the
+pipeline falls back to GCS (and re-spools what it downloaded).
+"""
+
+from pathlib import Path
+from typing import BinaryIO
+
+import config
+from services import gcs
+from services.disk_cache import DiskCache
+
+_cache = DiskCache(config.PDF_SPOOL_DIR, config.PDF_SPOOL_MAX_BYTES)
+
+
+def _key(doc_id: str) -> str:
+    return f"{doc_id}.pdf"
+
+
+def stage(src: BinaryIO) -> Path:
+    """Copy an upload stream to a staging file in the spool, chunk by chunk."""
+    return _cache.stage(src)
+
+
+def commit(doc_id: str, staged: Path) -> None:
+    """Spool a staged upload as the document's PDF."""
+    _cache.commit(_key(doc_id), staged)
+
+
+def abandon(staged: Path) -> None:
+    """Delete a staged upload that was rejected or failed."""
+    _cache.abandon(staged)
+
+
+def pdf_path(doc_id: str, pdf_url: str) -> Path:
+    """
+    Local path of a document's PDF: the spooled copy if present, otherwise
+    downloaded from GCS into the spool.
+
+    Args:
+        doc_id: Document record ID
+        pdf_url: The document's gs:// URL (used on a spool miss)
+    """
+    path = _cache.get_path(_key(doc_id))
+    if path is None:
+        # URL format: gs://bucket/pdfs/{doc_id}/{filename}
+        content = gcs.download_pdf(doc_id, pdf_url.split("/")[-1])
+        path = _cache.put(_key(doc_id), content)
+    return path
+
+
+def discard(doc_id: str) -> None:
+    """Drop a document's spooled PDF."""
+    _cache.discard(_key(doc_id))
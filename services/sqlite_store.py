@@ -0,0 +1,391 @@
+"""
+Embedded SQLite chunk and document store.
+
+Drop-in replacement for the Airtable service (see services/store.py) with
+no request rate or batch-size limits. Chunks are indexed on
+(doc_record_id, sequence_number), so per-document reads never scan the
+whole table. Records use Airtable-style "rec..." IDs and the same dict
+shapes, so routing and assembly work unchanged.
+"""
+
+import asyncio
+import secrets
+import sqlite3
+import string
+import threading
+from pathlib import Path
+
+from services.schema import (
+    CHUNK_FIELDS,
+    CHUNK_PROJECTIONS,
+    DOCUMENT_FIELDS,
+    DOCUMENT_PROJECTIONS,
+    format_chunk,
+    format_document,
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    record_id TEXT NOT NULL UNIQUE,
+    name TEXT,
+    status TEXT,
+    pdf_url TEXT,
+    total_chunks INTEGER,
+    total_pages INTEGER,
+    upload_date TEXT,
+    error_message TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_upload_date ON documents (upload_date);
+
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    record_id TEXT NOT NULL UNIQUE,
+    doc_record_id TEXT,
+    sequence_number INTEGER,
+    chunk_type TEXT,
+    content_raw TEXT,
+    content_offset INTEGER,
+    content_length INTEGER,
+    content_summary TEXT,
+    image_url TEXT,
+    heading_path TEXT,
+    token_count INTEGER,
+    source_pages TEXT
+);
+CREATE INDEX IF NOT EXISTS chunks_doc_sequence ON chunks (doc_record_id, sequence_number);
+CREATE INDEX IF NOT EXISTS chunks_sequence ON chunks (sequence_number);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Columns added after the first release: (table, column, type), applied to
+# existing databases on open
+_ADDED_COLUMNS = [
+    ("chunks", "content_offset", "INTEGER"),
+    ("chunks", "content_length", "INTEGER"),
+]
+
+# Writable columns (auto-numbers are assigned by SQLite)
+_DOCUMENT_COLUMNS = [f for f in DOCUMENT_FIELDS if f != "doc_id"]
+_CHUNK_COLUMNS = [f for f in CHUNK_FIELDS if f not in ("chunk_id", "doc_id")]
+
+# SQLite caps bound parameters per statement; stay well below the limit
+_IDS_PER_QUERY = 500
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+def _new_record_id() -> str:
+    """Generate an Airtable-style record ID (the router expects 'rec...')."""
+    return "rec" + "".join(secrets.choice(_ID_ALPHABET) for _ in range(14))
+
+
+class SQLiteStore:
+    """Document/chunk store backed by a local SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._connection().executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Add columns missing from databases created by older versions."""
+        conn = self._connection()
+        for table, column, column_type in _ADDED_COLUMNS:
+            existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection (sqlite3 connections are not thread-safe)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Close every connection opened by this store."""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    async def aclose(self) -> None:
+        """No async resources to release."""
+
+    # --- Documents ---
+
+    def list_documents(self, projection: str | None = None) -> list[dict]:
+        """List all documents, ordered by upload_date descending."""
+        fields = DOCUMENT_PROJECTIONS.get(projection)
+        rows = self._connection().execute(
+            "SELECT * FROM documents ORDER BY upload_date DESC, doc_id DESC"
+        )
+        return [self._format_document(row, fields) for row in rows]
+
+    async def alist_documents(self, projection: str | None = None) -> list[dict]:
+        """Async version of list_documents."""
+        return await asyncio.to_thread(self.list_documents, projection)
+
+    def get_document(self, record_id: str) -> dict | None:
+        """Get a document by record ID."""
+        row = self._connection().execute(
+            "SELECT * FROM documents WHERE record_id = ?", (record_id,)
+        ).fetchone()
+        return self._format_document(row) if row else None
+
+    def create_document(self, fields: dict) -> dict:
+        """Create a new document record. Returns the created document."""
+        record_id = _new_record_id()
+        values = {"record_id": record_id, **_columns(fields, _DOCUMENT_COLUMNS)}
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                f"INSERT INTO documents ({', '.join(values)}) "
+                f"VALUES ({', '.join('?' * len(values))})",
+                list(values.values()),
+            )
+        return self.get_document(record_id)
+
+    def update_document(self, record_id: str, fields: dict) -> dict:
+        """Update a document record. Returns the updated document."""
+        values = _columns(fields, _DOCUMENT_COLUMNS)
+        conn = self._connection()
+        with conn:
+            if values:
+                conn.execute(
+                    f"UPDATE documents SET {', '.join(f'{k} = ?' for k in values)} "
+                    "WHERE record_id = ?",
+                    [*values.values(), record_id],
+                )
+        document = self.get_document(record_id)
+        if document is None:
+            raise LookupError(f"Document not found: {record_id}")
+        return document
+
+    def delete_document(self, record_id: str) -> None:
+        """Delete a document record."""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM documents WHERE record_id = ?", (record_id,))
+
+    @staticmethod
+    def _format_document(row: sqlite3.Row, fields: list[str] | None = None) -> dict:
+        return format_document(row["record_id"], dict(row), fields)
+
+    # --- Chunks ---
+
+    def list_chunks(self, projection: str | None = None) -> list[dict]:
+        """List all chunks across documents, ordered by sequence_number."""
+        fields = CHUNK_PROJECTIONS.get(projection)
+        rows = self._connection().execute(
+            f"SELECT {_chunk_select(fields)} FROM chunks ORDER BY sequence_number, chunk_id"
+        )
+        return [self._format_chunk(row, fields) for row in rows]
+
+    async def alist_chunks(self, projection: str | None = None) -> list[dict]:
+        """Async version of list_chunks."""
+        return await asyncio.to_thread(self.list_chunks, projection)
+
+    def get_chunks_by_document(
+        self, doc_record_id: str, projection: str | None = None
+    ) -> list[dict]:
+        """Get all chunks for a document, ordered by sequence_number."""
+        fields = CHUNK_PROJECTIONS.get(projection)
+        rows = self._connection().execute(
+            f"SELECT {_chunk_select(fields)} FROM chunks WHERE doc_record_id = ? "
+            "ORDER BY sequence_number",
+            (doc_record_id,),
+        )
+        return [self._format_chunk(row, fields) for row in rows]
+
+    def get_chunks_by_ids(self, record_ids: list[str], projection: str | None = None) -> list[dict]:
+        """Get specific chunks by record ID (unordered)."""
+        fields = CHUNK_PROJECTIONS.get(projection)
+        conn = self._connection()
+        chunks = []
+        for i in range(0, len(record_ids), _IDS_PER_QUERY):
+            batch = record_ids[i : i + _IDS_PER_QUERY]
+            rows = conn.execute(
+                f"SELECT {_chunk_select(fields)} FROM chunks "
+                f"WHERE record_id IN ({', '.join('?' * len(batch))})",
+                batch,
+            )
+            chunks.extend(self._format_chunk(row, fields) for row in rows)
+        return chunks
+
+    async def aget_chunks_by_ids(
+        self, record_ids: list[str], projection: str | None = None
+    ) -> list[dict]:
+        """Async version of get_chunks_by_ids."""
+        return await asyncio.to_thread(self.get_chunks_by_ids, record_ids, projection)
+
+    def create_chunks(self, chunks: list[dict]) -> list[dict]:
+        """Create chunks in a single transaction. Returns created chunks."""
+        rows = []
+        for fields in chunks:
+            values = {"record_id": _new_record_id(), **_chunk_columns(fields)}
+            rows.append(values)
+
+        conn = self._connection()
+        with conn:
+            for values in rows:
+                conn.execute(
+                    f"INSERT INTO chunks ({', '.join(values)}) "
+                    f"VALUES ({', '.join('?' * len(values))})",
+                    list(values.values()),
+                )
+        created = {c["record_id"]: c for c in self.get_chunks_by_ids([r["record_id"] for r in rows])}
+        return [created[r["record_id"]] for r in rows]
+
+    def update_chunks(self, updates: dict[str, dict]) -> list[dict]:
+        """
+        Update chunks in a single transaction.
+
+        Args:
+            updates: Dict mapping chunk record ID to the fields to set
+
+        Returns:
+            Updated chunks
+        """
+        conn = self._connection()
+        with conn:
+            for record_id, fields in updates.items():
+                values = _chunk_columns(fields)
+                if not values:
+                    continue
+                conn.execute(
+                    f"UPDATE chunks SET {', '.join(f'{k} = ?' for k in values)} "
+                    "WHERE record_id = ?",
+                    [*values.values(), record_id],
+                )
+        return self.get_chunks_by_ids(list(updates))
+
+    def delete_chunks_by_document(self, doc_record_id: str) -> int:
+        """Delete all chunks for a document. Returns count deleted."""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute("DELETE FROM chunks WHERE doc_record_id = ?", (doc_record_id,))
+        return cursor.rowcount
+
+    @staticmethod
+    def _format_chunk(row: sqlite3.Row, fields: list[str] | None = None) -> dict:
+        data = dict(row)
+        if "doc_record_id" in data:
+            data["doc_id"] = [data["doc_record_id"]] if data["doc_record_id"] else []
+        return format_chunk(row["record_id"], data, fields)
+
+    # --- Replication (used when this store mirrors another backend) ---
+
+    def upsert_documents(self, documents: list[dict]) -> None:
+        """
+        Insert or update formatted documents, keeping their record IDs.
+
+        Only the fields present are written, so a projected record doesn't
+        clear the other columns.
+        """
+        rows = []
+        for doc in documents:
+            values = {"record_id": doc["record_id"]}
+            if doc.get("doc_id") is not None:
+                values["doc_id"] = doc["doc_id"]
+            values.update({k: doc[k] for k in _DOCUMENT_COLUMNS if k in doc})
+            rows.append(values)
+        self._upsert("documents", rows)
+
+    def upsert_chunks(self, chunks: list[dict]) -> None:
+        """Insert or update formatted chunks, keeping their record IDs (present fields only)."""
+        rows = []
+        for chunk in chunks:
+            values = {"record_id": chunk["record_id"]}
+            if chunk.get("chunk_id") is not None:
+                values["chunk_id"] = chunk["chunk_id"]
+            values.update({k: chunk[k] for k in _CHUNK_COLUMNS if k in chunk})
+            if not values.get("doc_record_id") and chunk.get("doc_id"):
+                values["doc_record_id"] = chunk["doc_id"][0]
+            rows.append(values)
+        self._upsert("chunks", rows)
+
+    def _upsert(self, table: str, rows: list[dict]) -> None:
+        conn = self._connection()
+        with conn:
+            for values in rows:
+                updates = ", ".join(f"{k} = excluded.{k}" for k in values if k != "record_id")
+                conn.execute(
+                    f"INSERT INTO {table} ({', '.join(values)}) "
+                    f"VALUES ({', '.join('?' * len(values))}) "
+                    f"ON CONFLICT(record_id) DO UPDATE SET {updates}",
+                    list(values.values()),
+                )
+
+    def prune(self, table: str, keep_ids: set[str]) -> int:
+        """Delete records of `table` ("documents" or "chunks") not in `keep_ids`."""
+        if table not in ("documents", "chunks"):
+            raise ValueError(f"Unknown table: {table}")
+        conn = self._connection()
+        stale = [
+            row["record_id"]
+            for row in conn.execute(f"SELECT record_id FROM {table}")
+            if row["record_id"] not in keep_ids
+        ]
+        with conn:
+            for i in range(0, len(stale), _IDS_PER_QUERY):
+                batch = stale[i : i + _IDS_PER_QUERY]
+                conn.execute(
+                    f"DELETE FROM {table} WHERE record_id IN ({', '.join('?' * len(batch))})",
+                    batch,
+                )
+        return len(stale)
+
+    def get_meta(self, key: str) -> str | None:
+        """Read a value from the meta table."""
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        """Write a value to the meta table."""
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def _columns(fields: dict, allowed: list[str]) -> dict:
+    """Validate field names against the table's columns."""
+    unknown = set(fields) - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return dict(fields)
+
+
+def _chunk_columns(fields: dict) -> dict:
+    """Map chunk fields to columns; the linked doc_id becomes doc_record_id."""
+    fields = dict(fields)
+    doc_id = fields.pop("doc_id", None)
+    if doc_id and not fields.get("doc_record_id"):
+        fields["doc_record_id"] = doc_id[0]
+    return _columns(fields, _CHUNK_COLUMNS)
+
+
+def _chunk_select(fields: list[str] | None) -> str:
+    """Column list for a chunk projection (doc_id is read from doc_record_id)."""
+    if fields is None:
+        return "*"
+    columns = {"record_id"}
+    for field in fields:
+        columns.add("doc_record_id" if field == "doc_id" else field)
+    return ", ".join(sorted(columns))
@@ -0,0 +1,72 @@
+"""
+Chunk and document storage.
+
+`store` is the backend selected by STORE_BACKEND: the Airtable service
+(default), Airtable behind a local SQLite read replica ("replica"), or an
+embedded SQLite database for high-throughput deployments and offline
+tests. Backends expose the functions in `Store` and return records in
+the shapes defined in services/schema.py.
+"""
+
+from typing import Protocol
+
+import config
+
+
+class Store(Protocol):
+    """Operations every storage backend provides."""
+
+    # Documents
+    def list_documents(self, projection: str | None = None) -> list[dict]: ...
+    async def alist_documents(self, projection: str | None = None) -> list[dict]: ...
+    def get_document(self, record_id: str) -> dict | None: ...
+    def create_document(self, fields: dict) -> dict: ...
+    def update_document(self, record_id: str, fields: dict) -> dict: ...
+    def delete_document(self, record_id: str) -> None: ...
+
+    # Chunks
+    def list_chunks(self, projection: str | None = None) -> list[dict]: ...
+    async def alist_chunks(self, projection: str | None = None) -> list[dict]: ...
+    def get_chunks_by_document(
+        self, doc_record_id: str, projection: str | None = None
+    ) -> list[dict]: ...
+    def get_chunks_by_ids(
+        self, record_ids: list[str], projection: str | None = None
+    ) -> list[dict]: ...
+    async def aget_chunks_by_ids(
+        self, record_ids: list[str], projection: str | None = None
+    ) -> list[dict]: ...
+    def create_chunks(self, chunks: list[dict]) -> list[dict]: ...
+    def update_chunks(self, updates: dict[str, dict]) -> list[dict]: ...
+    def delete_chunks_by_document(self, doc_record_id: str) -> int: ...
+
+    # Lifecycle
+    def close(self) -> None: ...
+    async def aclose(self) -> None: ...
+
+
+def _create_store() -> Store:
+    """Instantiate the configured backend."""
+    if config.STORE_BACKEND == "sqlite":
+        from services.sqlite_store import SQLiteStore
+
+        return SQLiteStore(config.SQLITE_STORE_PATH)
+
+    if config.STORE_BACKEND == "replica":
+        from services.replica import ReplicatedStore
+
+        return ReplicatedStore(
+            config.REPLICA_PATH,
+            sync_interval=config.REPLICA_SYNC_INTERVAL,
+            full_sync_interval=config.REPLICA_FULL_SYNC_INTERVAL,
+        )
+
+    if config.STORE_BACKEND == "airtable":
+        from services import airtable
+
+        return airtable
+
+    raise ValueError(f"Unsupported STORE_BACKEND: {config.STORE_BACKEND}")
+
+
+store: Store = _create_store()
@@ -0,0 +1,49 @@
+"""
+Small in-memory cache with per-entry expiry.
+
+Keys are tuples whose first element is a document ID, so every entry for
+a document can be dropped at once when it is renamed or deleted.
+Thread-safe; entries beyond `max_entries` are evicted oldest-first.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe dict of values that expire after their own TTL."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: tuple[Hashable, ...], default: Any = MISSING) -> Any:
+        """Cached value, or `default` if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            return value
+
+    def put(self, key: tuple[Hashable, ...], value: Any, ttl: float) -> None:
+        """Cache a value for `ttl` seconds."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, doc_id: str) -> None:
+        """Drop every entry for a document."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == doc_id]:
+                del self._entries[key]
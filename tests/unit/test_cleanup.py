@@ -0,0 +1,28 @@
+from pipeline.cleanup import cleanup
+
+
+def test_artifact_before_page_marker_and_fence_is_removed():
+    text, mapping = cleanup("code \n[PAGE 3]\n```")
+    assert text == "```"
+    assert mapping.ranges == [(0, 3, 3)]
+
+
+def test_artifacts_are_removed_one_pass_per_artifact():
+    # An artifact that only reaches the fence after its own pass (here, once a
+    # later artifact is removed) is left in place
+    assert cleanup("content_copy\nexpand_less\n```")[0] == "content_copy\n```"
+    assert cleanup("content_copy\n\nexpand_less\n\n```")[0] == "content_copy\n\n```"
+    assert cleanup("expand_less\n\ncontent_copy\n\n```")[0] == "```"
+    assert cleanup("```\ncontent_copy\nexpand_less\nx")[0] == "```\nx"
+
+
+def test_page_ranges_follow_removed_artifacts():
+    text, mapping = cleanup("[PAGE 1]\nintro\ncontent_copy\n```\nx = 1\n```\n[PAGE 2]\nnext")
+    assert text == "intro\n```\nx = 1\n```\nnext"
+    assert mapping.get_pages_for_range(0, text.index("next")) == "1"
+    assert mapping.get_pages_for_range(text.index("next"), len(text)) == "2"
+
+
+def test_breaks_are_resequenced():
+    text, _ = cleanup("a[BREAK id=7 score=60]b[PAGE 2]\nc[BREAK id=3 score=100]")
+    assert text == "a[BREAK id=1 score=60]bc[BREAK id=2 score=100]"
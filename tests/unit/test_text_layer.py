@@ -0,0 +1,40 @@
+from pipeline.text_layer import PageAnalysis, _Line, _render
+
+
+def _page(*texts: str) -> PageAnalysis:
+    """A local page of body-size lines; an empty text leaves a paragraph gap."""
+    lines = []
+    top = 100.0
+    for text in texts:
+        if text:
+            lines.append(_Line(text=text, top=top, bottom=top + 10, size=10.0))
+        top += 14
+    return PageAnalysis(page_num=3, local=True, lines=lines, height=800.0)
+
+
+def test_numbered_list_items_get_their_own_lines():
+    page = _page(
+        "Steps to install:",
+        "1. Download the installer",
+        "2) Run it",
+        "3. Reboot the",
+        "machine",
+    )
+    assert _render(page, {}, set()) == (
+        "[PAGE 3]\n"
+        "Steps to install:\n\n"
+        "1. Download the installer\n"
+        "2. Run it\n"
+        "3. Reboot the machine"
+    )
+
+
+def test_bulleted_list_items_get_their_own_lines():
+    page = _page("Requirements:", "• Python 3.11", "– A Gemini API", "key", "", "Then continue.")
+    assert _render(page, {}, set()) == (
+        "[PAGE 3]\n"
+        "Requirements:\n\n"
+        "- Python 3.11\n"
+        "- A Gemini API key\n\n"
+        "Then continue."
+    )